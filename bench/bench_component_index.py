@@ -0,0 +1,72 @@
+"""
+ microbenchmark of component name lookups
+    - legacy: lower-case linear scan of the components list (the old find_component)
+    - index: lib/component_index.py exact / prefix lookup, "did you mean" suggestions and
+      incremental sync after a status change and after a rename
+
+ usage: python bench/bench_component_index.py [components ...]
+"""
+import os
+import sys
+import random
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+
+from component_index import ComponentIndex
+
+WORDS = ['api', 'web', 'terminal', 'cashier', 'deposits', 'withdrawals', 'mobile', 'app', 'trading', 'payments',
+         'login', 'signup', 'reports', 'charts', 'feed', 'pricing', 'gateway', 'notifications', 'websocket', 'backoffice']
+
+def make_components(count, group_size=10):
+    rng = random.Random(count)
+    components = []
+    for g in range((count + group_size - 1) // group_size):
+        children = [f"c{g}-{i}" for i in range(min(group_size, count - g * group_size))]
+        components.append({"id": f"g{g}", "name": f"{rng.choice(WORDS)} group {g}", "group": True, "group_id": None, "components": children})
+        for child_id in children:
+            name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {child_id[1:]}"
+            components.append({"id": child_id, "name": name, "status": "operational", "group": False, "group_id": f"g{g}"})
+    return components
+
+def legacy_find(components, component_name):
+    component_name = component_name.lower()
+    for component in components:
+        if component['name'].lower() == component_name:
+            return component
+    return None
+
+def us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 5000]
+    print(f"{'components':>10} {'legacy find':>12} {'index exact':>12} {'index prefix':>13} {'suggest':>9} {'build':>9} {'sync status':>12} {'sync rename':>12}")
+    for size in sizes:
+        components = make_components(size)
+        target = components[-1]['name'].upper()
+        # swap two letters of the first word
+        first, rest = components[-1]['name'].split(' ', 1)
+        typo = f"{first[0]}{first[2]}{first[1]}{first[3:]} {rest}"
+        index = ComponentIndex()
+        build = us(lambda: ComponentIndex().sync(components), 1)
+        index.sync(components)
+
+        def status_change():
+            changed = list(components)
+            changed[-1] = {**changed[-1], "status": "major_outage"}
+            index.sync(changed)
+
+        def rename():
+            changed = list(components)
+            changed[-1] = {**changed[-1], "name": changed[-1]['name'] + ' x'}
+            index.sync(changed)
+            index.sync(components)
+
+        print(f"{size:>10} {us(lambda: legacy_find(components, target), 200):>10.1f}us {us(lambda: index.lookup(target), 2000):>10.1f}us"
+              f" {us(lambda: index.lookup(target[:-2]), 2000):>11.1f}us {us(lambda: index.suggest(typo), 200):>7.1f}us"
+              f" {build / 1e3:>7.1f}ms {us(status_change, 20):>10.1f}us {us(rename, 20) / 2:>10.1f}us")
+
+if __name__ == "__main__":
+    main()
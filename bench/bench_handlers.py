@@ -0,0 +1,237 @@
+"""
+ end-to-end benchmark of the bolt handlers in lib/app.py against tools/fake_statuspage.py.
+ drives the app_mention commands (run_command, and the ack path of handle_app_mention_events),
+ declare_incident, component_options, update_form_on_template and post_incident with the recorded
+ payloads in bench/payloads and a stand-in slack client, and reports p50/p95 latency and upstream
+ statuspage calls per command:
+    - cold: read caches and channel index cleared before every run, GETs are revalidated
+      with the validators of the previous run (--no-etags: with the digest of its body)
+    - warm: state kept between runs
+ every reply is checked for failures and for components or templates that are not found or ambiguous,
+ unless --error-rate or --rate-429 inject errors. before measuring, it checks that reads answered with
+ a 200 html page fail with "Operation failed".
+
+ usage: python bench/bench_handlers.py [--sizes 10 100 500] [--iterations 20] [--latency 0.02]
+                                       [--jitter 0.005] [--error-rate 0] [--rate-429 0] [--rate-limit 0] [--pages 1] [--no-etags]
+"""
+import os
+import sys
+import re
+import copy
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAYLOADS = os.path.join(ROOT, 'bench', 'payloads')
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+
+from fake_statuspage import FakeStatuspage
+
+FAILED_REPLY = re.compile(r"^(Operation failed|(Component|Template) .+ (not found|matches several)|\t(not found: |.+ failed: ))", re.M)
+
+class SlackStandIn:
+    """
+     records what the handlers send to slack instead of calling the web api
+    """
+    def __init__(self):
+        self.sent = []
+
+    def views_open(self, **kwargs):
+        self.sent.append(('views_open', kwargs))
+        return {'ok': True, 'view': {'id': 'V0001', 'hash': '1700000000.abcdef'}}
+
+    def views_update(self, **kwargs):
+        self.sent.append(('views_update', kwargs))
+        return {'ok': True, 'view': {'id': kwargs.get('view_id'), 'hash': '1700000000.abcdef'}}
+
+    def say(self, text=None, **kwargs):
+        self.sent.append(('say', text))
+
+    def failed_replies(self):
+        return [text for kind, text in self.sent if kind == 'say' and FAILED_REPLY.search(text)]
+
+def ack(*args, **kwargs):
+    pass
+
+def load_payload(name):
+    with open(os.path.join(PAYLOADS, f"{name}.json")) as file:
+        return json.load(file)
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(round(q * (len(values) - 1))), len(values) - 1)]
+
+def scenarios(app, views):
+    mention = load_payload('app_mention')
+    shortcut = load_payload('shortcut_declare_incident')
+    select_template = load_payload('block_actions_select_template')
+    submission = load_payload('view_submission_create_incident')
+    counter = iter(range(10 ** 9))
+
+    def run_mention(text, channel='CINC000000'):
+        def run(slack):
+            body = copy.deepcopy(mention)
+            body['event']['text'] = f"<@U0BOT> {text}"
+            body['event']['channel'] = channel
+            app.run_command(body, slack.say)
+        return run
+
+    def run_mention_ack(redelivery):
+        def run(slack):
+            body = copy.deepcopy(mention)
+            body['event']['text'] = "<@U0BOT> help"
+            body['event_id'] = "Ev0001" if redelivery else f"EvBENCH{next(counter)}"
+            app.handle_app_mention_events(body=body, say=slack.say, client=slack)
+        return run
+
+    def run_declare_incident(slack):
+        app.declare_incident(ack=ack, shortcut=copy.deepcopy(shortcut), client=slack)
+
+    def run_update_form_on_template(slack):
+        body = copy.deepcopy(select_template)
+        form = views.build_incident_form('C0001', [])
+        body['view']['blocks'] = copy.deepcopy(form['blocks'])
+        # slack fills in a block_id for every block of a submitted view
+        for i, block in enumerate(body['view']['blocks']):
+            block.setdefault('block_id', f"block{i}")
+        app.update_form_on_template(ack=ack, body=body, client=slack)
+
+    def run_post_incident(slack):
+        body = copy.deepcopy(submission)
+        view = body['view']
+        view['private_metadata'] = f"CBENCH{next(counter)}"
+        block_id = "select_components_partial_outage"
+        selected = [{"text": {"type": "plain_text", "text": f"component {i}"}, "value": f"cmp{i:06d}"} for i in range(2)]
+        view['state']['values'][block_id] = {block_id: {"type": "multi_external_select", "selected_options": selected}}
+        app.post_incident(ack=ack, body=body, client=slack, view=view, say=slack.say)
+
+    def run_component_options(query):
+        def run(slack):
+            app.component_options(ack=ack, payload={"action_id": "select_components_major_outage", "value": query})
+        return run
+
+    return [
+        ("app_mention ack", run_mention_ack(False)),
+        ("app_mention redelivery", run_mention_ack(True)),
+        ("help", run_mention("help")),
+        ("get unresolved", run_mention("get unresolved")),
+        ("get incidents since:7d", run_mention("get incidents since:7d")),
+        ("get incidents limit:500", run_mention("get incidents limit:500")),
+        ("get incident (channel)", run_mention("get incident")),
+        ("get incident <id>", run_mention("get incident inc000001")),
+        ("get components", run_mention("get components")),
+        ("update component", run_mention("update component component 1 degraded_performance")),
+        ("update components (bulk)", run_mention("update components component 1*, group:group 0 partial_outage")),
+        ("get templates", run_mention("get templates")),
+        ("get template", run_mention("get template template 0")),
+        ("update incident", run_mention("update incident monitoring bench update")),
+        ("declare incident (mention)", run_mention("declare incident", channel='C0001')),
+        ("declare_incident shortcut", run_declare_incident),
+        ("component_options (empty)", run_component_options("")),
+        ("component_options (prefix)", run_component_options("component 4")),
+        ("component_options (typo)", run_component_options("compnent 42")),
+        ("update_form_on_template", run_update_form_on_template),
+        ("post_incident", run_post_incident),
+    ]
+
+def measure(fake, statuspage, run, iterations, cold, check_replies):
+    latencies = []
+    calls = []
+    for _ in range(iterations):
+        if cold:
+            statuspage.clear_read_state()
+        slack = SlackStandIn()
+        before = fake.total_calls()
+        started_at = time.perf_counter()
+        run(slack)
+        latencies.append(time.perf_counter() - started_at)
+        calls.append(fake.total_calls() - before)
+        if check_replies:
+            assert not slack.failed_replies(), slack.failed_replies()
+    return percentile(latencies, 0.5), percentile(latencies, 0.95), statistics.mean(calls)
+
+def check_non_json_body(fake, statuspage, async_statuspage):
+    """
+     reads answered with a 200 that is not json (a proxy or maintenance page) are reported as failed
+     by the sync and async api instead of raising out of the handler
+    """
+    async def async_reads():
+        try:
+            return [await read() for read in (async_statuspage.get_components, async_statuspage.get_templates, async_statuspage.get_unresolved_incidents)]
+        finally:
+            await async_statuspage.statuspage_client.close()
+
+    fake.maintenance = True
+    try:
+        statuspage.clear_read_state()
+        outputs = [statuspage.get_components(), statuspage.get_templates(), statuspage.get_unresolved_incidents()]
+        statuspage.clear_read_state()
+        outputs += asyncio.run(async_reads())
+    finally:
+        fake.maintenance = False
+        statuspage.clear_read_state()
+    for output in outputs:
+        assert output['error'].startswith("Operation failed"), output
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500], help="number of components and of unresolved incidents, 10x as many resolved ones")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.02, help="fake statuspage latency per call in seconds")
+    parser.add_argument('--jitter', type=float, default=0.005)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0, help="client rate limit in calls/s, 0 disables it")
+    parser.add_argument('--pages', type=int, default=1, help="status pages served by the bot, each seeded like the first one")
+    parser.add_argument('--no-etags', dest='etags', action='store_false', help="fake statuspage sends no ETag")
+    args = parser.parse_args()
+
+    fake = FakeStatuspage('benchpage', 0, 0, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, rate_429=args.rate_429, etags=args.etags).start()
+    pages = [fake] + [fake.add_page(FakeStatuspage(f"benchpage{i}", 0, 0, id_tag=chr(ord('a') + i), etags=args.etags)) for i in range(1, args.pages)]
+    os.environ.update({
+        'SLACK_USER_IDS': 'U0001',
+        'SLACK_BOT_TOKEN': 'xoxb-bench',
+        'SLACK_SIGNING_SECRET': 'bench',
+        'SLACK_TOKEN_VERIFICATION': 'false',
+        'STATUSPAGE_API_KEY': 'bench',
+        'STATUSPAGE_PAGE_ID': fake.page_id,
+        'STATUSPAGE_PAGES': ','.join(f"{page.page_id}:{page.page_id}" for page in pages),
+        'STATUSPAGE_API_URL': fake.url,
+        'STATUSPAGE_SNAPSHOT_PATH': '',
+        'STATUSPAGE_RATE_LIMIT': str(args.rate_limit),
+    })
+    import app
+    import views
+    import statuspage
+    import async_statuspage
+    from statuspage_client import validator_store
+
+    check_non_json_body(fake, statuspage, async_statuspage)
+    check_replies = not (args.error_rate or args.rate_429)
+
+    print(f"fake statuspage latency {args.latency * 1e3:.0f}±{args.jitter * 1e3:.0f} ms, error rate {args.error_rate}, 429 rate {args.rate_429}, {args.iterations} iterations, {args.pages} pages")
+    for size in args.sizes:
+        for page in pages:
+            page.components.clear()
+            page.incidents.clear()
+            page.seed(size, size, resolved_incidents=10 * size)
+        statuspage.clear_read_state()
+        validator_store.clear()
+        counts = (fake.not_modified, validator_store.unchanged, validator_store.changed)
+        print(f"\n{size} components / {size} unresolved and {10 * size} resolved incidents per page")
+        print(f"{'command':<28} {'cold p50':>9} {'cold p95':>9} {'calls':>6} {'warm p50':>9} {'warm p95':>9} {'calls':>6}")
+        for name, run in scenarios(app, views):
+            cold = measure(fake, statuspage, run, args.iterations, cold=True, check_replies=check_replies)
+            warm = measure(fake, statuspage, run, args.iterations, cold=False, check_replies=check_replies)
+            print(f"{name:<28} {cold[0] * 1e3:8.1f}ms {cold[1] * 1e3:8.1f}ms {cold[2]:6.1f} {warm[0] * 1e3:8.1f}ms {warm[1] * 1e3:8.1f}ms {warm[2]:6.1f}")
+        not_modified, unchanged, changed = fake.not_modified - counts[0], validator_store.unchanged - counts[1], validator_store.changed - counts[2]
+        print(f"GET bodies: {not_modified} not modified (304), {unchanged} unchanged, {changed} parsed")
+    fake.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+ microbenchmark of building the create-incident modal
+    - legacy: json.load the templates and deepcopy a status select block per component
+    - views: precompiled skeletons from lib/views.py, a searchable multi-select per component
+      status whatever the number of components
+ views output is first checked against reference_build, a plain builder of the same modal from the template files
+
+ usage: python bench/bench_views.py [components ...]
+"""
+import os
+import sys
+import copy
+import json
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+
+from views import INCIDENT_STATUSES, IMPACTS, COMPONENT_STATUSES, TEMPLATE_DIR, build_incident_form
+
+# the per-component block of the legacy modal
+COMPONENT_STATUS_SELECT = {
+    "type": "input",
+    "optional": True,
+    "block_id": "select_status_component",
+    "element": {
+        "type": "static_select",
+        "placeholder": {"type": "plain_text", "text": "Select status"},
+        "options": [{"text": {"type": "plain_text", "text": s}, "value": s} for s in COMPONENT_STATUSES],
+        "action_id": "select_status_component",
+    },
+    "label": {"type": "plain_text", "text": "component"},
+}
+
+def legacy_build(channel_id, templates, components):
+    with open(os.path.join(TEMPLATE_DIR, 'incident-form.json')) as file:
+        form = json.load(file)
+    form['private_metadata'] = channel_id
+    for block in form['blocks']:
+        if block.get('block_id') == 'select_status':
+            block['element']['options'].extend([{"text": {"type": "plain_text", "text": s}, "value": s} for s in INCIDENT_STATUSES])
+        elif block.get('block_id') == 'select_impact':
+            block['element']['options'].extend([{"text": {"type": "plain_text", "text": i}, "value": i} for i in IMPACTS])
+        elif block.get('block_id') == 'select_template':
+            block['accessory']['options'].extend([{"text": {"type": "plain_text", "text": t['name']}, "value": t['name']} for t in templates])
+    for component in components:
+        block = copy.deepcopy(COMPONENT_STATUS_SELECT)
+        block['block_id'] += f"_{component['id']}"
+        block['element']['action_id'] += f"_{component['id']}"
+        block['label']['text'] = component['name']
+        form['blocks'].append(block)
+    return form
+
+def reference_build(channel_id, templates):
+    with open(os.path.join(TEMPLATE_DIR, 'incident-form.json')) as file:
+        form = json.load(file)
+    form['private_metadata'] = channel_id
+    for block in form['blocks']:
+        if block.get('block_id') == 'select_status':
+            block['element']['options'].extend([{"text": {"type": "plain_text", "text": s}, "value": s} for s in INCIDENT_STATUSES])
+        elif block.get('block_id') == 'select_impact':
+            block['element']['options'].extend([{"text": {"type": "plain_text", "text": i}, "value": i} for i in IMPACTS])
+        elif block.get('block_id') == 'select_template':
+            block['accessory']['options'].extend([{"text": {"type": "plain_text", "text": t['name']}, "value": t['name']} for t in templates])
+    with open(os.path.join(TEMPLATE_DIR, 'components-select.json')) as file:
+        components_select = json.load(file)
+    for status in COMPONENT_STATUSES:
+        block = copy.deepcopy(components_select)
+        block['block_id'] += f"_{status}"
+        block['element']['action_id'] += f"_{status}"
+        block['label']['text'] += f": {status.replace('_', ' ')}"
+        form['blocks'].append(block)
+    return form
+
+def fake_data(count):
+    templates = [{"name": f"template {i}"} for i in range(20)]
+    components = [{"id": f"cmp{i:06d}", "name": f"component {i}"} for i in range(count)]
+    return templates, components
+
+def bench(count, number=200):
+    templates, components = fake_data(count)
+    legacy_form = legacy_build('C1', templates, components)
+    form = build_incident_form('C1', templates)
+    assert json.dumps(form, sort_keys=True) == json.dumps(reference_build('C1', templates), sort_keys=True)
+    legacy = min(timeit.repeat(lambda: legacy_build('C1', templates, components), number=number, repeat=3)) / number
+    views = min(timeit.repeat(lambda: build_incident_form('C1', templates), number=number, repeat=3)) / number
+    print(f"{count:>6} components  legacy {len(legacy_form['blocks']):>5} blocks {len(json.dumps(legacy_form)):>8} bytes {legacy * 1e3:8.3f} ms"
+          f"  views {len(form['blocks']):>3} blocks {len(json.dumps(form)):>6} bytes {views * 1e3:8.3f} ms")
+
+if __name__ == "__main__":
+    for count in [int(arg) for arg in sys.argv[1:]] or [10, 50, 200, 500]:
+        bench(count)
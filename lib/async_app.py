@@ -0,0 +1,170 @@
+"""
+ asyncio runtime of the bot: the handlers of app.py on Bolt's AsyncApp and async socket mode adapter.
+ start with `BOT_RUNTIME=asyncio python lib/app.py` or `python lib/async_app.py`.
+"""
+import os
+import re
+import asyncio
+import logging
+from dotenv import load_dotenv
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+
+import async_statuspage
+from statuspage import INDEX_RECONCILE_INTERVAL, WEBHOOK_PORT, start_mirror, start_snapshot
+from views import *
+from commands import *
+from utils import configure_logging
+from metrics import instrument_handler, time_command, command_errors, start_metrics_server, METRICS_PORT
+from dispatch import AsyncChannelQueue, EventDeduper, listen_for_redeliveries, count_redelivery_async, events, QUEUED, REJECTED, DUPLICATE
+
+load_dotenv()
+SLACK_APP_TOKEN = os.getenv('SLACK_APP_TOKEN')
+SLACK_BOT_TOKEN = os.getenv('SLACK_BOT_TOKEN')
+
+logger = logging.getLogger(__name__)
+
+app = AsyncApp(token=SLACK_BOT_TOKEN)
+# runs the app_mention commands after the event is acked
+command_queue = AsyncChannelQueue()
+event_deduper = EventDeduper()
+
+@app.event("app_mention")
+async def handle_app_mention_events(body, say, client):
+    if not event_deduper.first_delivery(body):
+        events.inc(outcome=DUPLICATE)
+        return
+    outcome = command_queue.submit(body['event']['channel'], lambda: run_command(body, say))
+    events.inc(outcome=outcome)
+    if outcome == QUEUED:
+        await say(COMMAND_QUEUED)
+    elif outcome == REJECTED:
+        await say(COMMAND_REJECTED)
+
+async def run_command(body, say):
+    message_arr = body['event']['text'].split()
+    channel_id = body['event']['channel']
+    command = " ".join(message_arr[1:3])
+
+    commands = command_table(async_statuspage, message_arr, channel_id, enable_declare_incident)
+
+    with time_command(command if command in commands else "unknown"):
+        if command == "help":
+            await say(commands[command]())
+        elif command == "declare incident":
+            await say(await commands[command]())
+        elif command in STREAMED_COMMANDS:
+            async for output in commands[command]():
+                if output['error']:
+                    command_errors.inc(command=command)
+                await say(format_output(output))
+        elif command in commands:
+            output = await commands[command]()
+            if output['error']:
+                command_errors.inc(command=command)
+            await say(format_output(output))
+        else:
+            await say(COMMAND_NOT_FOUND)
+
+@app.shortcut("declare_incident")
+@instrument_handler("declare_incident")
+async def declare_incident(ack, shortcut, client):
+    await ack()
+    channel_id = shortcut['channel']['id']
+
+    # open a loading modal before the trigger_id expires, then fill it in
+    opened = await client.views_open(trigger_id=shortcut["trigger_id"], view=build_loading())
+    view_id = opened['view']['id']
+
+    if check_allowed_trigger(shortcut['channel']['name'], shortcut['user']['id'], shortcut['message']['text']):
+        has_incident, templates = await asyncio.gather(
+            check_channel_has_incident_attached(channel_id),
+            async_statuspage.get_templates(),
+        )
+        if not has_incident:
+            form_create_incident = build_incident_form(channel_id, templates['data'] if templates['error'] == '' else [])
+            await client.views_update(view_id=view_id, view=form_create_incident)
+            return
+    else:
+        has_incident = await check_channel_has_incident_attached(channel_id)
+
+    not_allowed = build_not_allowed(NOT_ALLOWED_INCIDENT_ATTACHED if has_incident else '')
+    await client.views_update(view_id=view_id, view=not_allowed)
+
+@app.view("form_create_incident")
+@instrument_handler("post_incident")
+async def post_incident(ack, body, client, view, say):
+    await ack()
+    incident = parse_incident_form(view)
+    output = await async_statuspage.create_incident(**incident)
+    await say(format_output(output), channel=incident['channel_id'])
+
+@app.options(re.compile(r"^select_components_"))
+@instrument_handler("component_options")
+async def component_options(ack, payload):
+    # search-as-you-type of the modal's component pickers, answered from the component index
+    matches = await async_statuspage.search_components(payload.get('value') or '')
+    await ack(**build_component_options(matches['data']))
+
+@app.action("select_template")
+@instrument_handler("update_form_on_template")
+async def update_form_on_template(ack, body, client):
+    await ack()
+
+    form_create_incident = build_incident_form_update(body['view'])
+
+    # update modal with data from template
+    selected_template_name = body['actions'][0]['selected_option']['value']
+    template = await async_statuspage.get_template(selected_template_name)
+    if not template['error']:
+        apply_template(form_create_incident, template['data'])
+
+    await client.views_update(
+        view_id=body['view']['id'],
+        hash=body['view']['hash'],
+        view=form_create_incident
+    )
+
+async def enable_declare_incident(channel_id):
+    # check if an unresolved incident is attached to this channel
+    if await check_channel_has_incident_attached(channel_id):
+        return DECLARE_REJECTED
+    return DECLARE_ENABLED
+
+async def check_channel_has_incident_attached(channel_id):
+    return await async_statuspage.find_incident_id_by_channel_id(channel_id) is not None
+
+async def reconcile_channel_index(interval=INDEX_RECONCILE_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await async_statuspage.refresh_channel_index()
+        except Exception:
+            logger.exception("channel index reconciliation failed")
+
+async def verify_token():
+    # App checks the token with auth.test when it is created (unless SLACK_TOKEN_VERIFICATION=false), AsyncApp does not
+    if os.getenv('SLACK_TOKEN_VERIFICATION') != 'false':
+        await app.client.auth_test()
+
+async def run():
+    await verify_token()
+    if METRICS_PORT:
+        start_metrics_server()
+    await asyncio.to_thread(start_snapshot)
+    if WEBHOOK_PORT:
+        # the mirror lives on its own threads, reads from it are plain in-memory lookups
+        await asyncio.to_thread(start_mirror)
+    reconciler = asyncio.create_task(reconcile_channel_index())
+    try:
+        await listen_for_redeliveries(AsyncSocketModeHandler(app, SLACK_APP_TOKEN), count_redelivery_async).start_async()
+    finally:
+        reconciler.cancel()
+        await async_statuspage.statuspage_client.close()
+
+def main():
+    configure_logging()
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
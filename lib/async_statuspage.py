@@ -0,0 +1,455 @@
+"""
+ asyncio version of the statuspage api.
+ functions have the same names, arguments and {"error","message","data"} outputs as statuspage.py
+ and share its caches and channel index; formatting is reused from statuspage.py.
+"""
+import os
+import json
+import time
+import asyncio
+import aiohttp
+
+import statuspage
+from statuspage import URL, PAGE_ID, PAGES, MULTI_PAGE, page_of
+import metrics
+from statuspage_client import RETRY_STATUSES, READ_METHODS, rate_limiter, validator_store, endpoint_of
+from throttle import AsyncSingleFlight
+from utils import TableChunks
+
+class AsyncStatuspageClient:
+    """
+     aiohttp counterpart of StatuspageClient: one pooled session, per-call timeouts,
+     bounded retries with backoff on 429 (any method), 5xx and connection errors or timeouts (GET, PUT),
+     rate limited by the shared token bucket and with identical concurrent GETs coalesced.
+     get_json revalidates the body of its last GET of a url through `validators`
+    """
+    def __init__(self, api_key, pool_size=10, connect_timeout=3.05, read_timeout=10, max_retries=3, backoff_factor=0.5, limiter=None, validators=None):
+        self.limiter = limiter
+        self.validators = validators
+        self.singleflight = AsyncSingleFlight()
+        self.api_key = api_key
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._session = None
+
+    @property
+    def session(self):
+        # created lazily so it binds to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={'Authorization': f"OAuth {self.api_key}"},
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self.timeout,
+            )
+        return self._session
+
+    async def request(self, method, url, **kwargs):
+        """
+         returns the parsed json body, raises aiohttp.ClientResponseError on an error status
+        """
+        if method in READ_METHODS and 'json' not in kwargs:
+            key = (method, url, tuple(sorted((kwargs.get('params') or {}).items())))
+            return await self.singleflight.do(key, lambda: self._send(method, url, **kwargs))
+        return await self._send(method, url, **kwargs)
+
+    async def get_json(self, url):
+        if self.validators is None:
+            return await self.request('GET', url)
+        return await self.singleflight.do(('json', url), lambda: self._send('GET', url, validators=self.validators))
+
+    async def _send(self, method, url, validators=None, **kwargs):
+        attempt = 0
+        if validators is not None:
+            kwargs['headers'] = validators.headers(url)
+        endpoint = endpoint_of(url)
+        while True:
+            if self.limiter is not None:
+                await self.limiter.acquire_async(write=method not in READ_METHODS)
+            status = None
+            error = None
+            metrics.requests_in_flight.inc()
+            started_at = time.perf_counter()
+            try:
+                r = await self.session.request(method, url, **kwargs)
+                status = r.status
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+                error = err
+            finally:
+                metrics.requests_in_flight.dec()
+                metrics.record_request(method, endpoint, status, time.perf_counter() - started_at)
+            if error is not None:
+                # like urllib3's connect/read retries of the sync client, only for idempotent methods
+                if method not in ('GET', 'HEAD', 'PUT') or attempt >= self.max_retries:
+                    raise error
+                metrics.retries.inc(method=method, status='error')
+                await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+                attempt += 1
+                continue
+            async with r:
+                retryable = r.status == 429 or (r.status in RETRY_STATUSES and method in ('GET', 'PUT'))
+                if retryable and attempt < self.max_retries:
+                    metrics.retries.inc(method=method, status=r.status)
+                    retry_after = r.headers.get('Retry-After', '')
+                    delay = float(retry_after) if retry_after.isdigit() else self.backoff_factor * (2 ** attempt)
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+                if validators is None:
+                    result = await r.json(content_type=None)
+                    r.raise_for_status()
+                    return result
+                if r.status == 304:
+                    result = validators.revalidated(url)
+                    if result is not None:
+                        return result
+                    # the stored body was evicted meanwhile, ask for it again
+                    kwargs.pop('headers')
+                    continue
+                r.raise_for_status()
+                return validators.store(url, r.headers, await r.read(), json.loads)
+
+    def stats(self):
+        stats = {"coalesced": self.singleflight.coalesced}
+        if self.validators is not None:
+            stats.update({
+                "not modified": self.validators.not_modified,
+                "unchanged bodies": self.validators.unchanged,
+            })
+        if self.limiter is not None:
+            stats.update({
+                "rate limited": self.limiter.delayed,
+                "rate limited seconds": round(self.limiter.delayed_seconds, 2),
+                "sent": self.limiter.acquired,
+            })
+        return stats
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+statuspage_client = AsyncStatuspageClient(
+    os.getenv('STATUSPAGE_API_KEY'),
+    pool_size=int(os.getenv('STATUSPAGE_POOL_SIZE') or 10),
+    connect_timeout=float(os.getenv('STATUSPAGE_CONNECT_TIMEOUT') or 3.05),
+    read_timeout=float(os.getenv('STATUSPAGE_READ_TIMEOUT') or 10),
+    max_retries=int(os.getenv('STATUSPAGE_MAX_RETRIES') or 3),
+    backoff_factor=float(os.getenv('STATUSPAGE_BACKOFF_FACTOR') or 0.5),
+    limiter=rate_limiter,
+    validators=validator_store,
+)
+
+@metrics.collector
+def async_client_metrics():
+    yield 'statuspage_coalesced_total', 'counter', "Statuspage GETs answered by an identical in-flight call", [({'runtime': 'asyncio'}, statuspage_client.singleflight.coalesced)]
+
+# errors reported as "Operation failed", like requests' RequestException in the sync api
+RequestErrors = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+
+def api_unavailable(err):
+    if isinstance(err, (asyncio.TimeoutError, aiohttp.ClientConnectionError)):
+        return True
+    return isinstance(err, aiohttp.ClientResponseError) and err.status >= 500
+
+async def fan_out(fn):
+    # fn(page_id) on every page at once, [(page_id, result, api error)] in page order
+    page_ids = list(PAGES.values())
+    results = await asyncio.gather(*[fn(page_id) for page_id in page_ids], return_exceptions=True)
+    outputs = []
+    for page_id, result in zip(page_ids, results):
+        if isinstance(result, RequestErrors):
+            outputs.append((page_id, None, result))
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            outputs.append((page_id, result, None))
+    return outputs
+
+async def cached_get(cache, key, target_url):
+    result = cache.get(key)
+    if result is None:
+        result = await statuspage_client.get_json(target_url)
+        cache.set(key, result)
+    return result
+
+async def create_incident(name, status, impact, channel_id, components_id, components, body):
+    output = {"error": "", "message": "", "data": ""}
+    incident_id = await find_incident_id_by_channel_id(channel_id)
+    if incident_id:
+        declared = await get_incident(incident_id)
+        if statuspage.already_declared(declared['data'], name):
+            output['message'] = declared['message']
+            return output
+    data = statuspage.incident_payload(name, status, impact, channel_id, components_id, components, body)
+    try:
+        if MULTI_PAGE and components_id:
+            statuspage.component_index.sync(await fetch_components())
+        target_url = f"{URL}{statuspage.incident_page(components_id)}/incidents"
+        result = await statuspage_client.request('POST', target_url, json=data)
+        statuspage.incident_created(result, channel_id, components)
+        output['message'] = (await get_incident(result['id']))['message']
+    except RequestErrors as err:
+        output['error'] = f"Operation failed: {err}"
+    return output
+
+async def fetch_page_unresolved(page_id):
+    if page_id == PAGE_ID and statuspage.mirror.ready:
+        return statuspage.mirror.unresolved_incidents(), False
+    result = statuspage.unresolved_cache.get(page_id)
+    if result is not None:
+        return result, False
+    result = await statuspage_client.get_json(f"{URL}{page_id}/incidents/unresolved")
+    statuspage.unresolved_cache.set(page_id, result)
+    if MULTI_PAGE:
+        statuspage.remember_pages(result, page_id)
+    return result, True
+
+async def unresolved_by_page():
+    started_at = time.monotonic()
+    results = await fan_out(fetch_page_unresolved)
+    answered = [result for _, result, err in results if err is None]
+    if any(fetched for _, fetched in answered) and (len(answered) == len(results) or not statuspage.channel_index.built):
+        statuspage.channel_index.rebuild(statuspage.merge_incidents([incidents for incidents, _ in answered]), started_at)
+    return [(page_id, result[0] if result else None, err) for page_id, result, err in results]
+
+async def fetch_unresolved_incidents():
+    return statuspage.merge_incidents(statuspage.answered_pages(await unresolved_by_page()))
+
+async def refresh_channel_index():
+    for page_id in PAGES.values():
+        statuspage.unresolved_cache.pop(page_id)
+    await fetch_unresolved_incidents()
+
+async def fetch_incident(incident_id):
+    result = statuspage.mirror.incident(incident_id) if statuspage.mirror.ready else None
+    if result is None:
+        page_id = statuspage.incident_pages.get(incident_id) if MULTI_PAGE else PAGE_ID
+        if page_id is not None:
+            result = await cached_get(statuspage.incident_cache, incident_id, f"{URL}{page_id}/incidents/{incident_id}")
+        else:
+            result = statuspage.incident_cache.get(incident_id) or await locate_incident(incident_id)
+    return result
+
+async def locate_incident(incident_id):
+    results = await fan_out(lambda page_id: cached_get(statuspage.incident_cache, incident_id, f"{URL}{page_id}/incidents/{incident_id}"))
+    for page_id, result, err in results:
+        if err is None:
+            statuspage.incident_pages.set(incident_id, page_id)
+            return result
+    raise results[0][2]
+
+async def fetch_page_components(page_id):
+    if page_id == PAGE_ID and statuspage.mirror.ready:
+        return statuspage.mirror.components()
+    return await cached_get(statuspage.components_cache, page_id, f"{URL}{page_id}/components")
+
+async def fetch_components():
+    return statuspage.merge_components(statuspage.answered_pages(await fan_out(fetch_page_components)))
+
+async def get_unresolved_incidents():
+    output = {"error": "", "message": "", "data": ""}
+    lists, notes, output['error'] = statuspage.gather_pages(await unresolved_by_page(), 'unresolved', api_unavailable)
+    if not output['error']:
+        result = statuspage.merge_incidents(lists)
+        output['message'] = notes + statuspage.format_unresolved_incidents(result)
+        output['data'] = result
+    return output
+
+async def get_incident(incident_id):
+    output = {"error": "", "message": "", "data": ""}
+    try:
+        result = await fetch_incident(incident_id)
+        output['message'] = statuspage.format_incident(result)
+        output['data'] = result
+    except RequestErrors as err:
+        stale = statuspage.stale_read('unresolved', statuspage.pick_incident(incident_id), statuspage.incident_pages.get(incident_id) or PAGE_ID) if api_unavailable(err) else None
+        if stale:
+            output['data'] = stale[0]
+            output['message'] = stale[1] + statuspage.format_incident(stale[0])
+        else:
+            output['error'] = f"Operation failed: {err}"
+    return output
+
+async def get_incident_timeline(channel_id, incident_id=None, show_all=False):
+    output = {"error": "", "message": "", "data": ""}
+    incident_id = incident_id or await get_unresolved_incident_id_by_channel_id(channel_id)
+    try:
+        result = await fetch_incident(incident_id)
+        output['message'] = statuspage.incident_timeline(channel_id, result, show_all)
+        output['data'] = result
+    except RequestErrors as err:
+        stale = statuspage.stale_read('unresolved', statuspage.pick_incident(incident_id), statuspage.incident_pages.get(incident_id) or PAGE_ID) if api_unavailable(err) else None
+        if stale:
+            output['data'] = stale[0]
+            output['message'] = stale[1] + statuspage.incident_timeline(channel_id, stale[0], show_all)
+        else:
+            output['error'] = f"Operation failed: {err}"
+    return output
+
+async def iter_incidents(filters, per_page=statuspage.HISTORY_PAGE_SIZE):
+    page = 1
+    remaining = filters['limit']
+    while remaining > 0:
+        result = await statuspage_client.request('GET', f"{URL}{PAGE_ID}/incidents", params={"page": page, "per_page": per_page})
+        matches, done = statuspage.filter_incidents(result, filters, remaining)
+        remaining -= len(matches)
+        for incident in matches:
+            yield incident
+        if done or len(result) < per_page:
+            return
+        page += 1
+
+async def stream_incidents(args):
+    output = {"error": "", "message": "", "data": ""}
+    try:
+        filters = statuspage.parse_incident_filters(args)
+    except ValueError as err:
+        output['error'] = str(err)
+        yield output
+        return
+    table = TableChunks(statuspage.HISTORY_COLUMNS, statuspage.HISTORY_WIDTHS)
+    try:
+        async for incident in iter_incidents(filters):
+            chunk = table.add(statuspage.incident_history_row(incident))
+            if chunk:
+                yield {"error": "", "message": chunk, "data": ""}
+    except RequestErrors as err:
+        output['error'] = f"Operation failed: {err}"
+        yield output
+        return
+    output['message'] = (table.flush() or '') + '\n' + statuspage.format_incident_history_end(table.rows, filters)
+    yield output
+
+async def update_incident(incident_id, status, body):
+    output = {"error": "", "message": "", "data": ""}
+    components_to_update = {}
+
+    incident = None
+    page_id = statuspage.incident_pages.get(incident_id) if MULTI_PAGE else PAGE_ID
+    # the incident is only read to resolve its components or to find the page it is on
+    if status == "resolved" or page_id is None:
+        incident = (await get_incident(incident_id))['data']
+        page_id = page_of(incident) if incident else PAGE_ID
+    target_url = f"{URL}{page_id}/incidents/{incident_id}"
+    # resolve components if resolving incident
+    if status == "resolved":
+        components_to_update = statuspage.components_to_resolve(incident)
+    data = statuspage.update_incident_payload(status, body, components_to_update)
+    try:
+        result = await statuspage_client.request('PATCH', target_url, json=data)
+        statuspage.incident_updated(incident_id, result, components_to_update)
+        output['message'] = statuspage.format_updated_incident(result)
+    except RequestErrors as err:
+        output['error'] = f"Operation failed: {err}"
+    return output
+
+async def find_incident_id_by_channel_id(channel_id):
+    if not statuspage.channel_index.built:
+        try:
+            await fetch_unresolved_incidents()
+        except RequestErrors:
+            return None
+    return statuspage.channel_index.get(channel_id)
+
+async def get_unresolved_incident_id_by_channel_id(channel_id):
+    return await find_incident_id_by_channel_id(channel_id) or "channel not linked to any incident"
+
+async def get_incident_by_channel_id(channel_id):
+    incident_id = await get_unresolved_incident_id_by_channel_id(channel_id)
+    return await get_incident(incident_id)
+
+async def update_incident_by_channel_id(channel_id, status, body):
+    incident_id = await get_unresolved_incident_id_by_channel_id(channel_id)
+    return await update_incident(incident_id, status, body)
+
+async def get_components():
+    output = {"error": "", "message": "Components' status", "data": ""}
+    lists, notes, output['error'] = statuspage.gather_pages(await fan_out(fetch_page_components), 'components', api_unavailable)
+    if not output['error']:
+        result = statuspage.merge_components(lists)
+        output['data'] = result
+        output['message'] = notes + statuspage.format_components(result)
+    return output
+
+async def search_components(query):
+    output = {"error": "", "message": "", "data": []}
+    lists, _, output['error'] = statuspage.gather_pages(await fan_out(fetch_page_components), 'components', api_unavailable)
+    if not output['error']:
+        components = statuspage.component_index.sync(statuspage.merge_components(lists)).search(query)
+        output['data'] = statuspage.format_component_matches(components)
+    return output
+
+async def get_component_by_name(component_name):
+    output = {"error": "", "message": "", "data": ""}
+    try:
+        output = statuspage.find_component(await fetch_components(), component_name)
+    except RequestErrors as err:
+        output['error'] = f"Operation failed: {err}"
+    return output
+
+async def update_component_by_name(component_name, status):
+    output = {"error": "", "message": "", "data": ""}
+    component_result = await get_component_by_name(component_name)
+    if component_result['data']:
+        output = await update_component(component_result['data']['id'], status, page_of(component_result['data']))
+    else:
+        output['error'] = component_result['error'] if component_result['error'] else f"Component {component_name} not found"
+    return output
+
+async def update_component(component_id, status, page_id=PAGE_ID):
+    output = {"error": "", "message": "", "data": ""}
+    target_url = f"{URL}{page_id}/components/{component_id}"
+    try:
+        result = await statuspage_client.request('PUT', target_url, json=statuspage.component_payload(status))
+        statuspage.patch_cached_component(result)
+        output['message'] = statuspage.format_updated_component(result)
+        output['data'] = result
+    except RequestErrors as err:
+        output['error'] = f"Operation failed: {err}"
+    return output
+
+async def update_components_by_names(targets, status):
+    output = {"error": "", "message": "", "data": ""}
+    try:
+        components, not_found = statuspage.resolve_components(await fetch_components(), statuspage.parse_component_targets(targets))
+    except RequestErrors as err:
+        output['error'] = f"Operation failed: {err}"
+        return output
+    if not components:
+        output['error'] = f"No components matched: {', '.join(not_found)}"
+        return output
+    outputs = await asyncio.gather(*[update_component(component['id'], status, page_of(component)) for component in components])
+    results = list(zip(components, outputs))
+    output['message'] = statuspage.format_bulk_update(results, not_found)
+    output['data'] = [result['data'] for _, result in results if result['data']]
+    return output
+
+async def get_templates():
+    output = {"error": "", "message": "Available templates:", "data": ""}
+    target_url = f"{URL}{PAGE_ID}/incident_templates"
+    try:
+        result = await cached_get(statuspage.templates_cache, PAGE_ID, target_url)
+        output['data'] = result
+        output['message'] = statuspage.format_templates(result)
+    except RequestErrors as err:
+        stale = statuspage.stale_read('templates') if api_unavailable(err) else None
+        if stale:
+            output['data'] = stale[0]
+            output['message'] = stale[1] + statuspage.format_templates(stale[0])
+        else:
+            output['error'] = f"Operation failed: {err}"
+    return output
+
+async def get_template(template_name):
+    output = {"error": "", "message": "", "data": ""}
+    templates = await get_templates()
+
+    if not templates['error']:
+        output = statuspage.find_template(templates['data'], template_name)
+    else:
+        output['error'] = templates['error']
+    return output
+
+async def get_client_stats():
+    return statuspage.format_client_stats(statuspage_client.stats())
@@ -0,0 +1,91 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+SLACK_ALLOWED_IDS = os.getenv('SLACK_USER_IDS').split(',')
+
+DECLARE_ENABLED = 'Declaring incident enabled. Use `declare incident` shortcut on this message to declare on status page.'
+DECLARE_REJECTED = 'Declaring incident `rejected`. This channel is attached to an unresolved incident.\nUse another channel to declare the incident or resolve the incident in this channel.'
+COMMAND_NOT_FOUND = "```command not found. use `help` to list commands.```"
+COMMAND_QUEUED = "```working on it, other commands are ahead of yours.```"
+COMMAND_REJECTED = "```too many commands in progress, try again in a moment.```"
+
+# commands answered with a plain message instead of an {"error","message","data"} output
+PLAIN_COMMANDS = ("help", "declare incident")
+# commands answered with several messages, their callables yield one output per message
+STREAMED_COMMANDS = ("get incidents",)
+
+def command_table(api, message_arr, channel_id, enable_declare_incident):
+    """
+     map of mention commands to callables.
+     `api` is the statuspage or async_statuspage module, so the same table serves
+     the sync app (callables return outputs) and the async app (callables return coroutines).
+     callables of STREAMED_COMMANDS return a generator (async generator) of outputs instead.
+    """
+    return {
+        "declare incident": lambda: enable_declare_incident(channel_id),
+        "get unresolved": api.get_unresolved_incidents,
+        "get incidents": lambda: api.stream_incidents(" ".join(message_arr[3:])),
+        "get incident": lambda: incident_command(api, message_arr[3:], channel_id),
+        "update incident": lambda: api.update_incident_by_channel_id(channel_id, message_arr[3], " ".join(message_arr[4:])),
+        "get components": api.get_components,
+        "update component": lambda: api.update_component_by_name(" ".join(message_arr[3:-1]), message_arr[-1]),
+        "update components": lambda: api.update_components_by_names(" ".join(message_arr[3:-1]), message_arr[-1]),
+        "get templates": api.get_templates,
+        "get template": lambda: api.get_template(" ".join(message_arr[3:])),
+        "get stats": api.get_client_stats,
+        "help": get_help,
+    }
+
+def incident_command(api, args, channel_id):
+    """
+     `get incident [id]` and `get incident timeline [id] [all]`, the incident defaults to the channel's
+    """
+    if args[:1] == ['timeline']:
+        ids = [arg for arg in args[1:] if arg != 'all']
+        return api.get_incident_timeline(channel_id, ids[0] if ids else None, show_all='all' in args[1:])
+    if args:
+        return api.get_incident(args[0])
+    return api.get_incident_by_channel_id(channel_id)
+
+def format_output(output):
+    return f"```\n{output['error'] if len(output['error']) > 0 else output['message']}\n```"
+
+def check_allowed_trigger(incident_name, slack_user_id, message):
+    """
+     allow operation if
+        - channel name starts with incident
+        - in the allowed user list
+        - message contains the keywords
+    """
+    return incident_name.startswith('incident') and slack_user_id in SLACK_ALLOWED_IDS and message == DECLARE_ENABLED
+
+def get_help():
+    return (
+        'Message shortcut:\n'
+        '`statuspage declare incident`:\n'
+        '\tenable `declare incident` shortcut on the message\n\n'
+        'Commands `@test-statuspage-bot <commands>`:\n'
+        '`get unresolved`:\n'
+        '\tget unresolved incidents\n'
+        '`get incidents [since:<YYYY-MM-DD|<n>d>] [until:<YYYY-MM-DD>] [status:<status>] [impact:<impact>] [limit:<n>]`:\n'
+        '\tget the incident history, newest first. status and impact take comma separated values.\n'
+        '`get incident`:\n'
+        '\tget info of an incident\n'
+        '`get incident timeline [id] [all]`:\n'
+        '\tget the updates of the channel\'s (or the given) incident posted since the last timeline in this channel, `all` for every update\n'
+        '`update incident <status> [description]`:\n'
+        '\tupdate the status of or resolve an incident. Resolving an incident resolves the affected components too. status: `investigating`, `identified`, `monitoring`, `resolved`\n'
+        '`get components`:\n'
+        '\tget status of all components\n'
+        '`update component <name> <status>`:\n'
+        '\tupdate the status of a component. status can be `operational`, `degraded_performance`, `partial_outage`, `major_outage`, `under_maintenance`. the name of component is not case sensitive, `<group>/<name>` picks a component in a group and `<page>:<name>` the component of one status page. a partial name only gets suggestions.\n'
+        '`update components <name>, <name>, ... <status>`:\n'
+        '\tupdate the status of several components at once. a name can be a glob (`api-*`) or a group (`group:<name>`) to update every component in it, a name matching several components only gets suggestions (use `<group>/<name>` or `<page>:<name>`).\n'
+        '`get templates`:\n'
+        '\tget all incident templates\' name and title\n'
+        '`get template <name>`:\n'
+        '\tget the details of the incident template. The name of template is not case sensitive.\n'
+        '`get stats`:\n'
+        '\tget the number of statuspage api calls sent, rate limited and coalesced\n'
+    )
@@ -0,0 +1,296 @@
+import re
+import heapq
+import threading
+
+def normalize(name):
+    # case and whitespace insensitive form of a name, `group / name` -> `group/name`
+    return re.sub(r' ?/ ?', '/', ' '.join(name.casefold().split()))
+
+def words_of(keys):
+    return set(re.split(r'[ /:]+', ' '.join(keys))) - {''}
+
+def edit_distance(a, b, limit):
+    """
+     optimal string alignment distance of `a` and `b`, or limit + 1 once it is known to exceed `limit`
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+def max_typos(word):
+    if len(word) < 3:
+        return 0
+    return 1 if len(word) < 6 else 2
+
+def deletes(word, distance):
+    # every string obtained by deleting up to `distance` characters of `word`
+    variants = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+class Trie:
+    """
+     prefix tree of keys, every node keeps the ids of the keys below it
+    """
+    def __init__(self):
+        self.root = {'': set()}
+
+    def insert(self, key, item):
+        node = self.root
+        node[''].add(item)
+        for char in key:
+            node = node.setdefault(char, {'': set()})
+            node[''].add(item)
+
+    def remove(self, key, item):
+        node = self.root
+        node[''].discard(item)
+        for char in key:
+            child = node.get(char)
+            if child is None:
+                return
+            child[''].discard(item)
+            if not child['']:
+                del node[char]
+                return
+            node = child
+
+    def prefixed(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return set()
+        return node['']
+
+class ComponentIndex:
+    """
+     lookup structures over one components list, for catalogues of hundreds of components:
+        - exact: normalized name -> ids, children are also indexed as `<group>/<name>`
+        - trie: prefixes of the same keys
+        - words: the words of the keys in a trie for search-as-you-type, and a symmetric
+          delete index of them for typo tolerant suggestions
+        - groups: group id -> child ids
+     with a `label` function (the page of a component), every key is also indexed as `<label>:<key>`.
+     sync() diffs a new list against the indexed one and only reindexes components whose
+     name or group changed; status changes just replace the stored component.
+    """
+    def __init__(self, label=None):
+        self.label = label
+        self.source = None
+        self._components = {}
+        self._keys = {}
+        self._exact = {}
+        self._trie = Trie()
+        self._words = {}
+        self._word_trie = Trie()
+        self._deletes = {}
+        self._children = {}
+        self._lock = threading.RLock()
+
+    def sync(self, components):
+        with self._lock:
+            if components is self.source:
+                return self
+            fresh = {component['id']: component for component in components}
+            # components whose keys may have changed: new, renamed or moved ones and the children of renamed groups
+            dirty = set()
+            for component_id in list(self._components):
+                if component_id not in fresh:
+                    dirty |= self._children.get(component_id, set())
+                    self._remove(component_id)
+            for component_id, component in fresh.items():
+                indexed = self._components.get(component_id)
+                if indexed is component:
+                    continue
+                if indexed is not None and self.shape(indexed) == self.shape(component):
+                    self._components[component_id] = component
+                    continue
+                if indexed is not None:
+                    self._move(component_id, indexed.get('group_id'), None)
+                self._components[component_id] = component
+                self._move(component_id, None, component.get('group_id'))
+                dirty.add(component_id)
+                dirty |= self._children.get(component_id, set())
+            for component_id in dirty:
+                component = self._components.get(component_id)
+                if component is None:
+                    continue
+                keys = self.keys_of(component)
+                if keys != self._keys.get(component_id):
+                    self._unindex(component_id)
+                    self._index(component_id, keys)
+            self.source = components
+            return self
+
+    @staticmethod
+    def shape(component):
+        # the fields the index is built from
+        return component['name'], component.get('group'), component.get('group_id'), tuple(component.get('components') or ()), component.get('page_id')
+
+    def _move(self, component_id, old_group_id, new_group_id):
+        if old_group_id and old_group_id in self._children:
+            self._children[old_group_id].discard(component_id)
+            if not self._children[old_group_id]:
+                del self._children[old_group_id]
+        if new_group_id:
+            self._children.setdefault(new_group_id, set()).add(component_id)
+
+    def keys_of(self, component):
+        name = normalize(component['name'])
+        group = self._components.get(component.get('group_id') or '')
+        keys = (name, f"{normalize(group['name'])}/{name}") if group is not None else (name,)
+        label = normalize(self.label(component)) if self.label else ''
+        if label:
+            keys += tuple(f"{label}:{key}" for key in keys)
+        return keys
+
+    def _index(self, component_id, keys):
+        self._keys[component_id] = keys
+        for key in keys:
+            self._exact.setdefault(key, set()).add(component_id)
+            self._trie.insert(key, component_id)
+        for word in words_of(keys):
+            ids = self._words.setdefault(word, set())
+            if not ids:
+                for variant in deletes(word, max_typos(word)):
+                    self._deletes.setdefault(variant, set()).add(word)
+            ids.add(component_id)
+            self._word_trie.insert(word, component_id)
+
+    def _unindex(self, component_id):
+        keys = self._keys.pop(component_id, ())
+        for key in keys:
+            ids = self._exact.get(key)
+            if ids is not None:
+                ids.discard(component_id)
+                if not ids:
+                    del self._exact[key]
+            self._trie.remove(key, component_id)
+        for word in words_of(keys):
+            self._word_trie.remove(word, component_id)
+            ids = self._words.get(word)
+            if ids is None:
+                continue
+            ids.discard(component_id)
+            if not ids:
+                del self._words[word]
+                for variant in deletes(word, max_typos(word)):
+                    words = self._deletes.get(variant)
+                    if words is not None:
+                        words.discard(word)
+                        if not words:
+                            del self._deletes[variant]
+
+    def _remove(self, component_id):
+        self._unindex(component_id)
+        component = self._components.pop(component_id, None)
+        if component is not None:
+            self._move(component_id, component.get('group_id'), None)
+
+    def component(self, component_id):
+        return self._components.get(component_id)
+
+    def exact(self, name):
+        return [self._components[i] for i in self._exact.get(normalize(name), ())]
+
+    def prefixed(self, prefix):
+        return [self._components[i] for i in self._trie.prefixed(normalize(prefix))]
+
+    def group(self, name):
+        return [c for c in self.exact(name) if c.get('group')]
+
+    def children(self, group_id):
+        return [self._components[i] for i in self._children.get(group_id, ())]
+
+    def group_name(self, component):
+        group = self._components.get(component.get('group_id') or '')
+        return group['name'] if group is not None else ''
+
+    def display_name(self, component):
+        group_name = self.group_name(component)
+        name = f"{group_name}/{component['name']}" if group_name else component['name']
+        label = self.label(component) if self.label else ''
+        return f"{label}:{name}" if label else name
+
+    def lookup(self, name):
+        """
+         (component, candidates): the only exact (or `<group>/<name>`) match of `name`, which is safe
+         to write to. candidates are the names to choose from: the exact matches when there are
+         several, else the components starting with `name`, which are never picked on their own
+        """
+        with self._lock:
+            key = normalize(name)
+            ids = self._exact.get(key, ()) if key else ()
+            if len(ids) == 1:
+                return self._components[next(iter(ids))], []
+            ids = ids or (self._trie.prefixed(key) if key else ())
+            return None, sorted(self.display_name(self._components[i]) for i in ids)[:5]
+
+    def search(self, query, limit=100):
+        """
+         components (groups excluded) for a picker, in catalogue order: those with a word starting
+         with each word of `query`, else the closest ones with a typo. every component when `query` is empty
+        """
+        with self._lock:
+            words = words_of([normalize(query)])
+            if not words:
+                ids = self._components
+            else:
+                matches = sorted((self._word_trie.prefixed(word) for word in words), key=len)
+                ids = matches[0].intersection(*matches[1:]) or self.fuzzy(query, limit)
+            components = (self._components[i] for i in ids)
+            return heapq.nsmallest(limit, (c for c in components if not c.get('group')), key=lambda c: (c.get('position', 0), c['name']))
+
+    def suggest(self, name, limit=3):
+        """
+         names of the components closest to `name` with a typo in its words
+        """
+        return [self.display_name(self._components[component_id]) for component_id in self.fuzzy(name, limit)]
+
+    def fuzzy(self, name, limit):
+        with self._lock:
+            # indexed words within typo distance of each query word, as (distance, word)
+            matched = []
+            for word in words_of([normalize(name)]):
+                if word in self._words:
+                    # correctly spelled words are not fuzzed
+                    matched.append([(0, word)])
+                    continue
+                distance = max_typos(word)
+                candidates = {candidate for variant in deletes(word, distance) for candidate in self._deletes.get(variant, ())}
+                found = [(d, candidate) for candidate in candidates if (d := edit_distance(word, candidate, distance)) <= distance]
+                if found:
+                    matched.append(sorted(found))
+            # the rarest query word picks the candidates, so common words ("api") do not make it scan the catalogue
+            matched.sort(key=lambda found: sum(len(self._words[candidate]) for _, candidate in found))
+            scores = {}
+            for i, found in enumerate(matched):
+                for d, candidate in found:
+                    ids = self._words[candidate]
+                    for component_id in (ids if i == 0 else [c for c in scores if c in ids]):
+                        best = scores.setdefault(component_id, {})
+                        best[i] = min(best.get(i, d), d)
+            # most query words matched first, then fewest typos, then the shortest name
+            ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (
+                -len(item[1]), sum(item[1].values()), len(self._components[item[0]]['name']), item[0],
+            ))
+            return [component_id for component_id, _ in ranked]
+
+def did_you_mean(suggestions):
+    return f" (did you mean: {', '.join(suggestions)}?)" if suggestions else ""
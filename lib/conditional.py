@@ -0,0 +1,72 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+class ValidatorStore:
+    """
+     the last 200 response of each GET url: its validators (ETag, Last-Modified), a digest of
+     its body and the parsed body, shared by the sync and async clients.
+        - the next GET of the url sends If-None-Match / If-Modified-Since, a 304 returns the stored body
+        - without validators, a body with the same digest is not parsed again
+     either way the stored body is the same object as before, so what was derived from it
+     (component index, rendered replies) can be reused as is.
+     at most `maxsize` urls are kept, least recently used is evicted first
+    """
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.not_modified = 0
+        self.unchanged = 0
+        self.changed = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def headers(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+        headers = {}
+        if entry is not None:
+            etag, last_modified = entry[0], entry[1]
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def revalidated(self, url):
+        """
+         stored body of `url` for a 304, None when it was evicted since the request was sent
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            self._entries.move_to_end(url)
+            self.not_modified += 1
+            return entry[3]
+
+    def store(self, url, headers, content, parse):
+        """
+         parsed body of a 200 response, the stored one when `content` did not change
+        """
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        with self._lock:
+            entry = self._entries.get(url)
+        unchanged = entry is not None and entry[2] == digest
+        data = entry[3] if unchanged else parse(content)
+        with self._lock:
+            if unchanged:
+                self.unchanged += 1
+            else:
+                self.changed += 1
+            self._entries[url] = (headers.get('ETag'), headers.get('Last-Modified'), digest, data)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
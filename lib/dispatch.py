@@ -0,0 +1,159 @@
+"""
+ execution layer of the app_mention commands: the event handler only checks the event and queues
+ its command, so slack gets its ack right away instead of redelivering an event whose statuspage
+ calls outlast the 3s window.
+    - redeliveries (same event_id) are dropped by a TTL store of seen events, and counted from the
+      `retry_attempt` of their socket mode envelope, which bolt does not pass on to the listeners
+    - commands run on a bounded pool, the commands of one channel one at a time in arrival order
+    - past COMMAND_QUEUE_BUSY queued commands the user is told the command is queued,
+      past COMMAND_QUEUE_LIMIT new commands are turned down
+"""
+import os
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+import metrics
+from cache import TTLCache
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+COMMAND_WORKERS = int(os.getenv('COMMAND_WORKERS') or 8)
+COMMAND_QUEUE_LIMIT = int(os.getenv('COMMAND_QUEUE_LIMIT') or 100)
+COMMAND_QUEUE_BUSY = int(os.getenv('COMMAND_QUEUE_BUSY') or COMMAND_WORKERS)
+# slack retries an event 3 times over about 5 minutes
+EVENT_DEDUPE_TTL = float(os.getenv('EVENT_DEDUPE_TTL') or 900)
+
+ACCEPTED, QUEUED, REJECTED, DUPLICATE = 'accepted', 'queued', 'rejected', 'duplicate'
+
+command_queues = []
+
+events = metrics.Counter('statuspage_bot_events_total', "app_mention events by outcome: accepted, queued behind a deep queue, rejected or duplicate", ['outcome'])
+redeliveries = metrics.Counter('statuspage_bot_event_redeliveries_total', "Events slack delivered again, by retry reason", ['reason'])
+
+class EventDeduper:
+    """
+     event ids delivered in the last `ttl` seconds
+    """
+    def __init__(self, ttl=EVENT_DEDUPE_TTL, maxsize=4096):
+        self.seen = TTLCache(ttl, maxsize)
+
+    def first_delivery(self, body):
+        event = body.get('event') or {}
+        # event_id is the same on every delivery, client_msg_id on every event of the same message
+        key = body.get('event_id') or event.get('client_msg_id') or (event.get('channel'), event.get('ts'))
+        return self.seen.add(key, True)
+
+def count_redelivery(client, request):
+    # socket mode request listener, runs before the one of bolt's handler
+    if request.retry_attempt:
+        redeliveries.inc(reason=request.retry_reason or 'unknown')
+
+async def count_redelivery_async(client, request):
+    count_redelivery(client, request)
+
+def listen_for_redeliveries(handler, listener=count_redelivery):
+    handler.client.socket_mode_request_listeners.insert(0, listener)
+    return handler
+
+class ChannelQueue:
+    """
+     bounded worker pool of `workers` threads, jobs submitted for the same channel run one
+     at a time in submission order so their replies and writes keep the order of the messages
+    """
+    def __init__(self, workers=COMMAND_WORKERS, limit=COMMAND_QUEUE_LIMIT, busy=COMMAND_QUEUE_BUSY):
+        self.limit = limit
+        self.busy = busy
+        self.pending = 0
+        self._channels = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="command")
+        self._lock = threading.Lock()
+        command_queues.append(self)
+
+    def submit(self, channel_id, job):
+        """
+         ACCEPTED or QUEUED (behind at least `busy` jobs) once `job` is queued, REJECTED when the queue is full
+        """
+        with self._lock:
+            if self.pending >= self.limit:
+                return REJECTED
+            ahead = self.pending
+            self.pending += 1
+            jobs = self._channels.get(channel_id)
+            if jobs is None:
+                jobs = self._channels[channel_id] = deque([job])
+                self._executor.submit(self._drain, channel_id, jobs)
+            else:
+                jobs.append(job)
+        return QUEUED if ahead >= self.busy else ACCEPTED
+
+    def _drain(self, channel_id, jobs):
+        while True:
+            with self._lock:
+                if not jobs:
+                    del self._channels[channel_id]
+                    return
+                job = jobs.popleft()
+            try:
+                job()
+            except Exception:
+                logger.exception("command failed in channel %s", channel_id)
+            finally:
+                with self._lock:
+                    self.pending -= 1
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+class AsyncChannelQueue:
+    """
+     asyncio counterpart of ChannelQueue: one task per channel with queued jobs,
+     at most `workers` jobs running at once. jobs are coroutine functions
+    """
+    def __init__(self, workers=COMMAND_WORKERS, limit=COMMAND_QUEUE_LIMIT, busy=COMMAND_QUEUE_BUSY):
+        self.limit = limit
+        self.busy = busy
+        self.pending = 0
+        self._workers = workers
+        self._slots = None
+        self._channels = {}
+        self._tasks = set()
+        command_queues.append(self)
+
+    def submit(self, channel_id, job):
+        if self.pending >= self.limit:
+            return REJECTED
+        ahead = self.pending
+        self.pending += 1
+        jobs = self._channels.get(channel_id)
+        if jobs is None:
+            jobs = self._channels[channel_id] = deque([job])
+            task = asyncio.get_running_loop().create_task(self._drain(channel_id, jobs))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            jobs.append(job)
+        return QUEUED if ahead >= self.busy else ACCEPTED
+
+    async def _drain(self, channel_id, jobs):
+        if self._slots is None:
+            # created on the running loop
+            self._slots = asyncio.Semaphore(self._workers)
+        while jobs:
+            job = jobs.popleft()
+            try:
+                async with self._slots:
+                    await job()
+            except Exception:
+                logger.exception("command failed in channel %s", channel_id)
+            finally:
+                self.pending -= 1
+        del self._channels[channel_id]
+
+@metrics.collector
+def command_queue_metrics():
+    yield 'statuspage_bot_command_queue_depth', 'gauge', "app_mention commands queued or running", [({}, sum(queue.pending for queue in command_queues))]
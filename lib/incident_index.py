@@ -0,0 +1,96 @@
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ChannelIndex:
+    """
+     channel_id -> incident_id index of unresolved incidents.
+     built from the unresolved list, then kept current by the write functions:
+        - add() when an incident is created for a channel
+        - remove_incident() when an incident is resolved
+     rebuild() keeps changes made while its snapshot was being fetched,
+     so a concurrent create/resolve is not undone by an older list.
+    """
+    def __init__(self):
+        self.built_at = None
+        self._by_channel = {}
+        self._added_at = {}
+        self._removed_at = {}
+        self._lock = threading.Lock()
+
+    @property
+    def built(self):
+        return self.built_at is not None
+
+    def rebuild(self, incidents, started_at=None):
+        started_at = started_at if started_at is not None else time.monotonic()
+        by_channel = {}
+        with self._lock:
+            for incident in incidents:
+                channel_id = (incident.get('metadata') or {}).get('slack', {}).get('channel_id')
+                if not channel_id:
+                    continue
+                removed_at = self._removed_at.get(incident['id'])
+                if removed_at is None or removed_at < started_at:
+                    by_channel[channel_id] = incident['id']
+            for channel_id, added_at in self._added_at.items():
+                if added_at >= started_at and channel_id in self._by_channel:
+                    by_channel[channel_id] = self._by_channel[channel_id]
+            self._by_channel = by_channel
+            self._added_at = {c: t for c, t in self._added_at.items() if t >= started_at}
+            self._removed_at = {i: t for i, t in self._removed_at.items() if t >= started_at}
+            self.built_at = time.monotonic()
+
+    def add(self, channel_id, incident_id):
+        with self._lock:
+            self._by_channel[channel_id] = incident_id
+            self._added_at[channel_id] = time.monotonic()
+            self._removed_at.pop(incident_id, None)
+
+    def remove_incident(self, incident_id):
+        with self._lock:
+            self._removed_at[incident_id] = time.monotonic()
+            for channel_id, indexed_id in list(self._by_channel.items()):
+                if indexed_id == incident_id:
+                    del self._by_channel[channel_id]
+                    self._added_at.pop(channel_id, None)
+
+    def load(self, by_channel):
+        # seed from a persisted mapping, the next rebuild replaces it
+        with self._lock:
+            self._by_channel = dict(by_channel)
+            self.built_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._by_channel = {}
+            self._added_at = {}
+            self._removed_at = {}
+            self.built_at = None
+
+    def items(self):
+        return dict(self._by_channel)
+
+    def get(self, channel_id):
+        return self._by_channel.get(channel_id)
+
+    def __len__(self):
+        return len(self._by_channel)
+
+def start_reconciler(interval, reconcile, name="channel-index-reconciler"):
+    """
+     run `reconcile` every `interval` seconds on a daemon thread
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                reconcile()
+            except Exception:
+                logger.exception("%s failed", name)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,36 @@
+from utils import parse_time
+
+class Incident:
+    """
+     parsed view of a statuspage incident json.
+     timestamps are parsed once and the updates kept newest first; parsed updates of
+     the previous model of the same incident are reused, so a refetch only parses new updates.
+    """
+    __slots__ = ('data', 'id', 'created_at', 'updated_at', 'updates')
+
+    def __init__(self, data, previous=None):
+        self.data = data
+        self.id = data['id']
+        self.created_at = parse_time(data['created_at'])
+        self.updated_at = parse_time(data['updated_at'])
+        known = {}
+        if previous is not None:
+            known = {(update['id'], update['created_at']): created_at for created_at, update in previous.updates}
+        updates = []
+        for update in data.get('incident_updates') or []:
+            created_at = known.get((update['id'], update['created_at']))
+            updates.append((created_at or parse_time(update['created_at']), update))
+        updates.sort(key=lambda entry: entry[0], reverse=True)
+        self.updates = updates
+
+    @property
+    def latest_update(self):
+        return self.updates[0][1] if self.updates else {}
+
+    def updates_after(self, seen_at):
+        """
+         (created_at, update) newer than `seen_at`, newest first. all of them when `seen_at` is None
+        """
+        if seen_at is None:
+            return self.updates
+        return [entry for entry in self.updates if entry[0] > seen_at]
@@ -0,0 +1,259 @@
+"""
+ in-process metrics exposed in prometheus text format, without a client library.
+ every metric keeps its own lock and a dict of label values, so recording is a few microseconds
+ and can stay on in production. values read from other objects (caches, rate limiter) are
+ collected at scrape time by functions registered with `collector`.
+"""
+import os
+import time
+import bisect
+import inspect
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = os.getenv('METRICS_PORT')
+METRICS_PATH = os.getenv('METRICS_PATH') or '/metrics'
+# log one line per command, handler and statuspage call
+TRACE = os.getenv('METRICS_TRACE') == 'true'
+
+# seconds, slack expects an ack within 3s
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+metrics = []
+collectors = []
+
+def format_labels(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = ','.join(f'{name}="{escape(value)}"' for name, value in zip(labelnames, values))
+    return f"{{{pairs}}}"
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        metrics.append(self)
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels):
+        return self._values.get(self.key(labels), 0)
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def inc(self, value=1, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def dec(self, value=1, **labels):
+        self.inc(-value, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self.key(labels)] = value
+
+    def value(self, **labels):
+        return self._values.get(self.key(labels), 0)
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # per-bucket counts (last one is +Inf), sum, count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels):
+        entry = self._values.get(self.key(labels))
+        return entry[2] if entry else 0
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            values = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        labelnames = self.labelnames + ('le',)
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels(labelnames, key + (format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {count}")
+        return lines
+
+def collector(fn):
+    """
+     register `fn` to be called on every scrape, it yields (name, type, help, [(labels, value), ...])
+    """
+    collectors.append(fn)
+    return fn
+
+def render():
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    # several collectors may yield samples of the same metric, each metric is written once
+    families = {}
+    for fn in collectors:
+        try:
+            for name, type, help, samples in fn():
+                families.setdefault(name, (type, help, []))[2].extend(samples)
+        except Exception:
+            logger.exception("metrics collector %s failed", fn.__name__)
+    for name, (type, help, samples) in families.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {type}")
+        for labels, value in samples:
+            lines.append(f"{name}{format_labels(tuple(labels), tuple(labels.values()))} {format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+# slack side
+command_seconds = Histogram('statuspage_bot_command_seconds', "Time to run an app_mention command", ['command'])
+command_errors = Counter('statuspage_bot_command_errors_total', "app_mention commands that returned or raised an error", ['command'])
+commands_in_flight = Gauge('statuspage_bot_commands_in_flight', "app_mention commands being run")
+handler_seconds = Histogram('statuspage_bot_handler_seconds', "Time to run a shortcut, view or action handler", ['handler'])
+handler_errors = Counter('statuspage_bot_handler_errors_total', "Shortcut, view or action handlers that raised", ['handler'])
+handlers_in_flight = Gauge('statuspage_bot_handlers_in_flight', "Shortcut, view or action handlers being run", ['handler'])
+
+# statuspage side, one sample per _send of a client: an http attempt for the async client, a whole
+# request for the sync one, whose urllib3 retries (and the 429/5xx they retried) only show in `retries`
+request_seconds = Histogram('statuspage_request_seconds', "Statuspage api call latency, rate limiter wait excluded", ['method', 'endpoint'])
+responses = Counter('statuspage_responses_total', "Statuspage api responses by status code", ['method', 'endpoint', 'status'])
+request_errors = Counter('statuspage_request_errors_total', "Statuspage api calls that failed without a response", ['method', 'endpoint'])
+requests_in_flight = Gauge('statuspage_requests_in_flight', "Statuspage api calls waiting for a response")
+retries = Counter('statuspage_retries_total', "Statuspage api calls retried by the client", ['method', 'status'])
+
+@contextmanager
+def timed(histogram, errors, in_flight, **labels):
+    """
+     time the block into `histogram`, count an exception into `errors`, track it in `in_flight`
+    """
+    in_flight.inc(**labels)
+    started_at = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors.inc(**labels)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started_at
+        in_flight.dec(**labels)
+        histogram.observe(elapsed, **labels)
+        if TRACE:
+            logger.info("trace %s %s %.1fms", histogram.name, ' '.join(f"{k}={v}" for k, v in labels.items()), elapsed * 1e3)
+
+def time_command(command):
+    return timed(command_seconds, command_errors, commands_in_flight, command=command)
+
+def time_handler(handler):
+    return timed(handler_seconds, handler_errors, handlers_in_flight, handler=handler)
+
+def instrument_handler(handler):
+    """
+     decorator timing a bolt listener (sync or async) into handler_seconds.
+     bolt reads the listener's arguments through functools.wraps, so it can go under @app.view etc.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with time_handler(handler):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with time_handler(handler):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_request(method, endpoint, status, elapsed):
+    """
+     status is the http status code, or None when no response was received
+    """
+    request_seconds.observe(elapsed, method=method, endpoint=endpoint)
+    if status is None:
+        request_errors.inc(method=method, endpoint=endpoint)
+    else:
+        responses.inc(method=method, endpoint=endpoint, status=status)
+    if TRACE:
+        logger.info("trace statuspage %s %s %s %.1fms", method, endpoint, status or 'error', elapsed * 1e3)
+
+def start_metrics_server(port=METRICS_PORT, path=METRICS_PATH, host='0.0.0.0'):
+    """
+     serve `render()` on GET `path`
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != path:
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+    logger.info("metrics on http://%s:%s%s", host, port, path)
+    return server
@@ -0,0 +1,81 @@
+import time
+import threading
+from collections import OrderedDict
+
+RESOLVED_STATUSES = ('resolved', 'completed', 'postmortem')
+
+class StateMirror:
+    """
+     in-process copy of statuspage incidents and components.
+     fed by webhook notifications and the bot's own writes, corrected by a periodic full resync;
+     a resync keeps entries a webhook changed while the resync was being fetched.
+    """
+    def __init__(self, max_age, max_incidents=500):
+        self.max_age = max_age
+        self.max_incidents = max_incidents
+        self.synced_at = None
+        self.updates = 0
+        self._incidents = OrderedDict()
+        self._components = {}
+        self._components_list = None
+        self._touched_at = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        # only serve reads while the last full resync is recent enough to trust
+        return self.synced_at is not None and time.monotonic() - self.synced_at < self.max_age
+
+    def resync(self, incidents, components, started_at):
+        with self._lock:
+            fresh_incidents = OrderedDict((incident['id'], incident) for incident in incidents)
+            for incident_id, incident in self._incidents.items():
+                if self._touched_at.get(incident_id, 0) >= started_at or incident['status'] in RESOLVED_STATUSES:
+                    fresh_incidents[incident_id] = incident
+            fresh_components = {component['id']: component for component in components}
+            for component_id, component in self._components.items():
+                if self._touched_at.get(component_id, 0) >= started_at:
+                    fresh_components[component_id] = component
+            self._incidents = fresh_incidents
+            self._components = fresh_components
+            self._components_list = None
+            self._touched_at = {key: t for key, t in self._touched_at.items() if t >= started_at}
+            self._trim()
+            self.synced_at = time.monotonic()
+
+    def apply_incident(self, incident):
+        with self._lock:
+            existing = self._incidents.pop(incident['id'], {})
+            self._incidents[incident['id']] = {**existing, **incident}
+            self._touched_at[incident['id']] = time.monotonic()
+            self.updates += 1
+            self._trim()
+            return self._incidents[incident['id']]
+
+    def apply_component(self, component):
+        with self._lock:
+            merged = {**self._components.get(component['id'], {}), **component}
+            self._components[component['id']] = merged
+            self._components_list = None
+            self._touched_at[component['id']] = time.monotonic()
+            self.updates += 1
+            return merged
+
+    def _trim(self):
+        # resolved incidents are kept for `get incident` until the bound is reached
+        resolved = [i for i, incident in self._incidents.items() if incident['status'] in RESOLVED_STATUSES]
+        for incident_id in resolved[:max(len(self._incidents) - self.max_incidents, 0)]:
+            del self._incidents[incident_id]
+
+    def unresolved_incidents(self):
+        return [incident for incident in self._incidents.values() if incident['status'] not in RESOLVED_STATUSES]
+
+    def incident(self, incident_id):
+        return self._incidents.get(incident_id)
+
+    def components(self):
+        # the same list until a component changes, so the component index can skip unchanged lists
+        components = self._components_list
+        if components is None:
+            components = self._components_list = list(self._components.values())
+        return components
@@ -0,0 +1,52 @@
+import json
+import time
+import sqlite3
+import threading
+
+class Snapshot:
+    """
+     last good statuspage reads persisted in a local sqlite file.
+     loaded once at startup into memory; answers reads when the live api is unavailable.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._data = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS snapshot (key TEXT PRIMARY KEY, data TEXT NOT NULL, saved_at REAL NOT NULL)")
+
+    def load(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT key, data, saved_at FROM snapshot").fetchall()
+            self._data = {key: (json.loads(data), saved_at) for key, data, saved_at in rows}
+        return len(self._data)
+
+    def save(self, entries):
+        # entries: {key: data}, written in one transaction
+        saved_at = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO snapshot (key, data, saved_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(data), saved_at) for key, data in entries.items()],
+            )
+            for key, data in entries.items():
+                self._data[key] = (data, saved_at)
+
+    def get(self, key):
+        """
+         returns (data, saved_at) or None
+        """
+        return self._data.get(key)
+
+    def close(self):
+        self._conn.close()
+
+def format_age(saved_at):
+    seconds = int(max(time.time() - saved_at, 0))
+    if seconds < 120:
+        return f"{seconds}s"
+    if seconds < 7200:
+        return f"{seconds // 60}m"
+    return f"{seconds // 3600}h {seconds % 3600 // 60}m"
@@ -1,22 +1,143 @@
 import requests
 import os
 import json
+import time
+import fnmatch
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
+import metrics
 from utils import * 
+from statuspage_client import client_from_env
+from cache import TTLCache
+from incident_model import Incident
+from component_index import ComponentIndex, normalize, did_you_mean
+from incident_index import ChannelIndex, start_reconciler
+from mirror import StateMirror, RESOLVED_STATUSES
+from webhooks import start_webhook_server
+from snapshot import Snapshot, format_age
 
 load_dotenv()
-URL = 'https://api.statuspage.io/v1/pages/'
-API_KEY = os.getenv('STATUSPAGE_API_KEY')
-PAGE_ID = os.getenv('STATUSPAGE_PAGE_ID')
-HEADERS = {'Authorization': f"OAuth {API_KEY}"}
+logger = logging.getLogger(__name__)
+URL = os.getenv('STATUSPAGE_API_URL') or 'https://api.statuspage.io/v1/pages/'
 
-def create_incident(name, status, impact, channel_id, components_id, components, body):
-    output = {"error": "", "message": "", "data": ""}
-    target_url = f"{URL}{PAGE_ID}/incidents"
+def parse_pages(text):
+    # "public:<page id>,internal:<page id>" -> {name: page id}, a bare page id is its own name
+    pages = {}
+    for entry in (text or '').split(','):
+        name, _, page_id = entry.strip().rpartition(':')
+        if page_id:
+            pages[name or page_id] = page_id
+    return pages
+
+# status pages served by the bot, STATUSPAGE_PAGES or else the single STATUSPAGE_PAGE_ID.
+# the first one is the default page: it gets new incidents without components and serves
+# templates, the incident history and the webhook mirror
+PAGES = parse_pages(os.getenv('STATUSPAGE_PAGES')) or {os.getenv('STATUSPAGE_PAGE_ID'): os.getenv('STATUSPAGE_PAGE_ID')}
+PAGE_ID = next(iter(PAGES.values()))
+PAGE_NAMES = {page_id: name for name, page_id in PAGES.items()}
+PAGE_ORDER = {page_id: i for i, page_id in enumerate(PAGES.values())}
+MULTI_PAGE = len(PAGES) > 1
+
+# one pooled session shared by every call below
+statuspage_client = client_from_env()
+# runs the per-page calls of a read that fans out across the pages
+page_executor = ThreadPoolExecutor(max_workers=4 * len(PAGES), thread_name_prefix="statuspage-pages")
+
+# read caches, invalidated or patched by the write functions below
+unresolved_cache = TTLCache(ttl=float(os.getenv('STATUSPAGE_CACHE_TTL_UNRESOLVED') or 15), maxsize=8)
+incident_cache = TTLCache(ttl=float(os.getenv('STATUSPAGE_CACHE_TTL_INCIDENT') or 10), maxsize=256)
+components_cache = TTLCache(ttl=float(os.getenv('STATUSPAGE_CACHE_TTL_COMPONENTS') or 30), maxsize=8)
+templates_cache = TTLCache(ttl=float(os.getenv('STATUSPAGE_CACHE_TTL_TEMPLATES') or 300), maxsize=8)
+
+# page of the incidents seen so far, for the calls that only have an incident id
+incident_pages = TTLCache(ttl=7 * 24 * 3600, maxsize=4096)
+
+# parsed incidents by id, and the newest update each channel has seen of an incident's timeline
+incident_models = TTLCache(ttl=24 * 3600, maxsize=256)
+timeline_cursors = TTLCache(ttl=7 * 24 * 3600, maxsize=1024)
+
+def page_name(item):
+    return PAGE_NAMES.get(item.get('page_id'), item.get('page_id') or '')
+
+# name lookups over the latest components list, with several pages a component is also `<page>:<name>`
+component_index = ComponentIndex(label=page_name if MULTI_PAGE else None)
+
+# channel_id -> incident_id of unresolved incidents
+channel_index = ChannelIndex()
+INDEX_RECONCILE_INTERVAL = float(os.getenv('STATUSPAGE_INDEX_RECONCILE_INTERVAL') or 300)
+
+# optional mirror of incidents and components fed by statuspage webhooks, reads are served from it while it is fresh
+MIRROR_RESYNC_INTERVAL = float(os.getenv('STATUSPAGE_MIRROR_RESYNC_INTERVAL') or 300)
+WEBHOOK_PORT = os.getenv('STATUSPAGE_WEBHOOK_PORT')
+WEBHOOK_SECRET = os.getenv('STATUSPAGE_WEBHOOK_SECRET') or ''
+WEBHOOK_PATH = f"/statuspage/webhook/{WEBHOOK_SECRET}".rstrip('/')
+mirror = StateMirror(max_age=3 * MIRROR_RESYNC_INTERVAL)
+
+# last good reads persisted to sqlite, used for warm startup and when the api is unavailable.
+# opened by start_snapshot(), so importing this module does not create the file
+SNAPSHOT_PATH = os.getenv('STATUSPAGE_SNAPSHOT_PATH', 'statuspage-snapshot.sqlite3')
+SNAPSHOT_REFRESH_INTERVAL = float(os.getenv('STATUSPAGE_SNAPSHOT_REFRESH_INTERVAL') or 300)
+snapshot = None
+
+# runs the PUTs of a bulk component update, the rate limiter still paces them
+BULK_UPDATE_CONCURRENCY = int(os.getenv('STATUSPAGE_BULK_UPDATE_CONCURRENCY') or 8)
+bulk_executor = ThreadPoolExecutor(max_workers=BULK_UPDATE_CONCURRENCY, thread_name_prefix="statuspage-bulk")
+
+# incident history is paged through lazily and sent as several messages
+HISTORY_PAGE_SIZE = int(os.getenv('STATUSPAGE_HISTORY_PAGE_SIZE') or 100)
+HISTORY_LIMIT = int(os.getenv('STATUSPAGE_HISTORY_LIMIT') or 500)
+HISTORY_COLUMNS = ['Incident ID', 'Incident Name', 'Status', 'Impact', 'Created']
+HISTORY_WIDTHS = [14, 40, 14, 8, 19]
+
+@metrics.collector
+def read_state_metrics():
+    caches = {'unresolved': unresolved_cache, 'incident': incident_cache, 'components': components_cache, 'templates': templates_cache}
+    yield 'statuspage_cache_hits_total', 'counter', "Read cache hits", [({'cache': name}, cache.hits) for name, cache in caches.items()]
+    yield 'statuspage_cache_misses_total', 'counter', "Read cache misses", [({'cache': name}, cache.misses) for name, cache in caches.items()]
+    yield 'statuspage_cache_hit_ratio', 'gauge', "Read cache hits / lookups since startup", [
+        ({'cache': name}, cache.hits / (cache.hits + cache.misses)) for name, cache in caches.items() if cache.hits + cache.misses
+    ]
+    yield 'statuspage_cache_entries', 'gauge', "Entries in the read caches", [({'cache': name}, len(cache)) for name, cache in caches.items()]
+    yield 'statuspage_channel_index_entries', 'gauge', "Channels with an unresolved incident", [({}, len(channel_index))]
+    yield 'statuspage_coalesced_total', 'counter', "Statuspage GETs answered by an identical in-flight call", [({'runtime': 'sync'}, statuspage_client.singleflight.coalesced)]
+    yield 'statuspage_mirror_ready', 'gauge', "1 when reads are served from the webhook mirror", [({}, int(mirror.ready))]
+    yield 'statuspage_mirror_updates_total', 'counter', "Webhook updates applied to the mirror", [({}, mirror.updates)]
+
+def clear_read_state():
+    # drop every cached read, the next lookups go to the api (or the mirror)
+    for cache in (unresolved_cache, incident_cache, components_cache, templates_cache):
+        cache.clear()
+    channel_index.clear()
+
+def cached_get(cache, key, target_url):
+    result = cache.get(key)
+    if result is None:
+        result = statuspage_client.get_json(target_url)
+        cache.set(key, result)
+    return result
+
+def page_of(item):
+    return item.get('page_id') or PAGE_ID
+
+def page_label(page_id):
+    # tag of a page in messages, only shown when there are several
+    return f"[{PAGE_NAMES.get(page_id, page_id)}] " if MULTI_PAGE else ''
+
+def patch_cached_component(component):
+    page_id = page_of(component)
+    if page_id == PAGE_ID and mirror.synced_at is not None:
+        mirror.apply_component(component)
+    components = components_cache.get(page_id)
+    if components is not None:
+        components_cache.set(page_id, [component if c['id'] == component['id'] else c for c in components])
+
+def incident_payload(name, status, impact, channel_id, components_id, components, body):
     metadata = {"slack": {"channel_id": channel_id}  }
-    data = {
+    return {
         "incident": {
             "name": name,
             "status": status,
@@ -27,105 +148,579 @@ def create_incident(name, status, impact, channel_id, components_id, components,
             "component_ids": components_id
         }  
     }
+
+# bookkeeping after successful writes, shared by the sync and async apis
+def incident_created(result, channel_id, components):
+    page_id = page_of(result)
+    if page_id == PAGE_ID and mirror.synced_at is not None:
+        mirror.apply_incident(result)
+    incident_cache.set(result['id'], result)
+    incident_pages.set(result['id'], page_id)
+    unresolved_cache.pop(page_id)
+    channel_index.add(channel_id, result['id'])
+    if components:
+        components_cache.pop(page_id)
+
+def incident_updated(incident_id, result, components_to_update):
+    page_id = page_of(result)
+    if page_id == PAGE_ID and mirror.synced_at is not None:
+        mirror.apply_incident(result)
+    incident_cache.set(incident_id, result)
+    unresolved_cache.pop(page_id)
+    if result['status'] in RESOLVED_STATUSES:
+        channel_index.remove_incident(incident_id)
+    if components_to_update:
+        components_cache.pop(page_id)
+
+def incident_page(components_id):
+    """
+     page of a new incident: the page of its components, the default page without components.
+     raises ValueError when they belong to several pages
+    """
+    pages = {page_of(component_index.component(component_id) or {}) for component_id in components_id}
+    if len(pages) > 1:
+        raise ValueError(f"Components of several pages selected ({', '.join(sorted(PAGE_NAMES.get(p, p) for p in pages))}), an incident belongs to one page")
+    return pages.pop() if pages else PAGE_ID
+
+def already_declared(incident, name):
+    # the channel already has the incident this form declares: the form was submitted twice
+    return bool(incident) and incident.get('name') == name
+
+def create_incident(name, status, impact, channel_id, components_id, components, body):
+    output = {"error": "", "message": "", "data": ""}
+    incident_id = find_incident_id_by_channel_id(channel_id)
+    if incident_id:
+        declared = get_incident(incident_id)
+        if already_declared(declared['data'], name):
+            output['message'] = declared['message']
+            return output
+    data = incident_payload(name, status, impact, channel_id, components_id, components, body)
     try:
-        r = requests.post(target_url, headers=HEADERS, json=data)
+        if MULTI_PAGE and components_id:
+            component_index.sync(fetch_components())
+        r = statuspage_client.post(f"{URL}{incident_page(components_id)}/incidents", json=data)
         result = r.json()
         r.raise_for_status()
+        incident_created(result, channel_id, components)
         output['message'] = get_incident(result['id'])['message']
-    except requests.exceptions.RequestException as err:
+    except (requests.exceptions.RequestException, ValueError) as err:
         output['error'] = f"Operation failed: {err}"
     return output
 
+def fan_out(fn):
+    """
+     fn(page_id) on every page at once, [(page_id, result, api error)] in page order.
+     the first page runs on the calling thread, so a single page costs no thread hop;
+     a page failing does not fail the others
+    """
+    page_ids = list(PAGES.values())
+    futures = [page_executor.submit(fn, page_id) for page_id in page_ids[1:]]
+    results = []
+    for page_id, future in zip(page_ids, [None] + futures):
+        try:
+            results.append((page_id, fn(page_id) if future is None else future.result(), None))
+        except requests.exceptions.RequestException as err:
+            results.append((page_id, None, err))
+    return results
+
+def answered_pages(results):
+    # results of the pages that answered, raises the first page error when none did
+    answered = [result for _, result, err in results if err is None]
+    if not answered:
+        raise results[0][2]
+    return answered
+
+def gather_pages(results, key, unavailable=None):
+    """
+     (results of the pages, notes, error) of fan_out results: a page the api could not serve
+     is read from the snapshot with a note, error is set when no page could be read
+    """
+    unavailable = unavailable or api_unavailable
+    lists, notes, failed = [], '', []
+    for page_id, result, err in results:
+        if err is not None:
+            stale = stale_read(key, page_id=page_id) if unavailable(err) else None
+            if stale is None:
+                failed.append(err)
+                notes += f"{page_label(page_id)}Operation failed: {err}\n"
+                continue
+            result = stale[0]
+            notes += page_label(page_id) + stale[1]
+        lists.append(result)
+    error = f"Operation failed: {failed[0]}" if len(failed) == len(results) else ''
+    return lists, notes, error
+
+# a merged list is reused while no page's list changed, so the component index and the rendered replies see the same list
+merged_lists = {}
+
+def merge_lists(kind, lists, merge):
+    if len(lists) == 1:
+        return lists[0]
+    sources, merged = merged_lists.get(kind, ((), None))
+    if len(sources) != len(lists) or any(source is not page_list for source, page_list in zip(sources, lists)):
+        merged = merge(lists)
+        merged_lists[kind] = (tuple(lists), merged)
+    return merged
+
+def merge_incidents(lists):
+    # a single page keeps the api order, several are merged newest first
+    return merge_lists('incidents', lists, lambda lists: sorted(
+        (incident for incidents in lists for incident in incidents), key=lambda incident: incident['created_at'], reverse=True,
+    ))
+
+def merge_components(lists):
+    return merge_lists('components', lists, lambda lists: [component for components in lists for component in components])
+
+def remember_pages(incidents, page_id):
+    for incident in incidents:
+        incident_pages.set(incident['id'], page_id)
+
+def fetch_page_unresolved(page_id):
+    # (unresolved incidents of the page, whether they came from the api)
+    if page_id == PAGE_ID and mirror.ready:
+        return mirror.unresolved_incidents(), False
+    result = unresolved_cache.get(page_id)
+    if result is not None:
+        return result, False
+    result = statuspage_client.get_json(f"{URL}{page_id}/incidents/unresolved")
+    unresolved_cache.set(page_id, result)
+    if MULTI_PAGE:
+        remember_pages(result, page_id)
+    return result, True
+
+def unresolved_by_page():
+    """
+     fan_out of the unresolved incidents. the channel index is rebuilt when a page came from
+     the api and every page answered, or from the pages that answered while it is not built yet
+    """
+    started_at = time.monotonic()
+    results = fan_out(fetch_page_unresolved)
+    answered = [result for _, result, err in results if err is None]
+    if any(fetched for _, fetched in answered) and (len(answered) == len(results) or not channel_index.built):
+        channel_index.rebuild(merge_incidents([incidents for incidents, _ in answered]), started_at)
+    return [(page_id, result[0] if result else None, err) for page_id, result, err in results]
+
+def fetch_unresolved_incidents():
+    return merge_incidents(answered_pages(unresolved_by_page()))
+
+def refresh_channel_index():
+    for page_id in PAGES.values():
+        unresolved_cache.pop(page_id)
+    fetch_unresolved_incidents()
+
+def start_channel_index_reconciler(interval=INDEX_RECONCILE_INTERVAL):
+    return start_reconciler(interval, refresh_channel_index)
+
+def fetch_incident(incident_id):
+    result = mirror.incident(incident_id) if mirror.ready else None
+    if result is None:
+        page_id = incident_pages.get(incident_id) if MULTI_PAGE else PAGE_ID
+        if page_id is not None:
+            result = cached_get(incident_cache, incident_id, f"{URL}{page_id}/incidents/{incident_id}")
+        else:
+            result = incident_cache.get(incident_id) or locate_incident(incident_id)
+    return result
+
+def locate_incident(incident_id):
+    # an incident of an unknown page is asked of every page at once, the page that has it answers
+    results = fan_out(lambda page_id: cached_get(incident_cache, incident_id, f"{URL}{page_id}/incidents/{incident_id}"))
+    for page_id, result, err in results:
+        if err is None:
+            incident_pages.set(incident_id, page_id)
+            return result
+    raise results[0][2]
+
+def fetch_page_components(page_id):
+    if page_id == PAGE_ID and mirror.ready:
+        return mirror.components()
+    return cached_get(components_cache, page_id, f"{URL}{page_id}/components")
+
+def fetch_components():
+    return merge_components(answered_pages(fan_out(fetch_page_components)))
+
+def api_unavailable(err):
+    if isinstance(err, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    response = getattr(err, 'response', None)
+    return response is not None and response.status_code >= 500
+
+def stale_read(key, pick=None, page_id=PAGE_ID):
+    """
+     snapshot data for `key` of a page (optionally narrowed by `pick`) and a note with its age, or None
+    """
+    entry = snapshot.get(f"{page_id}:{key}") if snapshot else None
+    if entry is None:
+        return None
+    data = pick(entry[0]) if pick else entry[0]
+    if data is None:
+        return None
+    return data, f"(statuspage unavailable, snapshot from {format_age(entry[1])} ago)\n"
+
+def pick_incident(incident_id):
+    return lambda incidents: next((incident for incident in incidents if incident['id'] == incident_id), None)
+
+def refresh_page_snapshot(page_id):
+    # templates are only read from the default page
+    data = {
+        'unresolved': statuspage_client.get_json(f"{URL}{page_id}/incidents/unresolved"),
+        'components': statuspage_client.get_json(f"{URL}{page_id}/components"),
+    }
+    if page_id == PAGE_ID:
+        data['templates'] = statuspage_client.get_json(f"{URL}{page_id}/incident_templates")
+    unresolved_cache.set(page_id, data['unresolved'])
+    components_cache.set(page_id, data['components'])
+    if 'templates' in data:
+        templates_cache.set(page_id, data['templates'])
+    if MULTI_PAGE:
+        remember_pages(data['unresolved'], page_id)
+    return data
+
+def refresh_snapshot():
+    """
+     live reads of everything the snapshot keeps, also used to warm the read caches.
+     pages that answered are saved even when another one failed
+    """
+    started_at = time.monotonic()
+    results = fan_out(refresh_page_snapshot)
+    entries = {f"{page_id}:{key}": value for page_id, data, err in results if err is None for key, value in data.items()}
+    errors = [err for _, _, err in results if err is not None]
+    if not errors:
+        channel_index.rebuild(merge_incidents([data['unresolved'] for _, data, _ in results]), started_at)
+        entries[f"{PAGE_ID}:channels"] = channel_index.items()
+    if entries and snapshot is not None:
+        snapshot.save(entries)
+    if errors:
+        raise errors[0]
+
+def start_snapshot(interval=SNAPSHOT_REFRESH_INTERVAL):
+    """
+     open and load the snapshot, seed the channel index from it and keep it refreshed in the background
+    """
+    global snapshot
+    if not SNAPSHOT_PATH:
+        return None
+    if snapshot is None:
+        snapshot = Snapshot(SNAPSHOT_PATH)
+    snapshot.load()
+    channels = snapshot.get(f"{PAGE_ID}:channels")
+    if channels and not channel_index.built:
+        channel_index.load(channels[0])
+
+    def refresh():
+        try:
+            refresh_snapshot()
+        except requests.exceptions.RequestException as err:
+            logger.warning("snapshot refresh failed: %s", err)
+
+    threading.Thread(target=refresh, name="snapshot-warmup", daemon=True).start()
+    return start_reconciler(interval, refresh_snapshot, name="snapshot-refresh")
+
+def ingest_webhook(payload):
+    """
+     apply a statuspage webhook notification (incident or component) to the mirror,
+     the read caches and the channel index
+    """
+    page_id = (payload.get('page') or {}).get('id')
+    if page_id and page_id != PAGE_ID:
+        return
+    if payload.get('incident'):
+        incident = mirror.apply_incident(payload['incident'])
+        incident_cache.pop(incident['id'])
+        unresolved_cache.pop(PAGE_ID)
+        channel_id = (incident.get('metadata') or {}).get('slack', {}).get('channel_id')
+        if incident['status'] in RESOLVED_STATUSES:
+            channel_index.remove_incident(incident['id'])
+        elif channel_id:
+            channel_index.add(channel_id, incident['id'])
+    elif payload.get('component'):
+        component = mirror.apply_component(payload['component'])
+        components = components_cache.get(PAGE_ID)
+        if components is not None:
+            components_cache.set(PAGE_ID, [component if c['id'] == component['id'] else c for c in components])
+
+def resync_mirror():
+    started_at = time.monotonic()
+    incidents = statuspage_client.get_json(f"{URL}{PAGE_ID}/incidents/unresolved")
+    components = statuspage_client.get_json(f"{URL}{PAGE_ID}/components")
+    mirror.resync(incidents, components, started_at)
+    if MULTI_PAGE:
+        # the mirror only has the default page, the index also needs the other pages' incidents
+        refresh_channel_index()
+    else:
+        channel_index.rebuild(mirror.unresolved_incidents(), started_at)
+
+def start_mirror(port=WEBHOOK_PORT, path=WEBHOOK_PATH, interval=MIRROR_RESYNC_INTERVAL):
+    # statuspage does not sign webhooks: without a secret in the path anyone could post forged
+    # notifications into the mirror and the channel index, so the mirror is not started
+    if path.rstrip('/') == '/statuspage/webhook':
+        logger.error("STATUSPAGE_WEBHOOK_SECRET is not set, the statuspage webhook receiver and mirror are disabled")
+        return None
+    # reads fall back to the api until the first resync succeeds
+    try:
+        resync_mirror()
+    except requests.exceptions.RequestException as err:
+        logger.warning("initial mirror resync failed: %s", err)
+    start_reconciler(interval, resync_mirror, name="mirror-resync")
+    return start_webhook_server(int(port), path, ingest_webhook)
+
+@render_cache()
+def format_unresolved_incidents(result):
+    table_data = []
+    # incidents are tagged with their page when there are several
+    page_column = ['Page'] if MULTI_PAGE else []
+    table_data.append(page_column + ['Incident ID', 'Incident Name', 'Status', 'Last Updated'])
+    message = f"Total unresolved incidents: {len(result)}"
+    if len(result) > 0:
+        for incident in result:
+            page = [page_name(incident)] if MULTI_PAGE else []
+            table_data.append(page + [incident['id'], incident['name'], incident['status'], convert_utc_to_display(incident['updated_at'])])
+        message += create_table(table_data)
+    return message
+
 def get_unresolved_incidents():
     output = {"error": "", "message": "", "data": ""}
-    target_url = f"{URL}{PAGE_ID}/incidents/unresolved"
-    table_data = []
-    table_data.append(['Incident ID', 'Incident Name', 'Status', 'Last Updated'])
+    lists, notes, output['error'] = gather_pages(unresolved_by_page(), 'unresolved')
+    if not output['error']:
+        result = merge_incidents(lists)
+        output['message'] = notes + format_unresolved_incidents(result)
+        output['data'] = result
+    return output
+
+def incident_model(result):
+    # reuse the parsed incident while it is unchanged, otherwise only its new updates are parsed
+    model = incident_models.get(result['id'])
+    if model is None or model.data['updated_at'] != result['updated_at'] or len(model.updates) != len(result.get('incident_updates') or []):
+        model = Incident(result, previous=model)
+        incident_models.set(result['id'], model)
+    return model
+
+def format_incident(result):
+    model = incident_model(result)
+    message = ( f"Incident: {result['name']}"
+                f"\n\tstatus: {result['status']}"
+                f"\n\timpact: {result['impact']}"
+                f"\n\tcreated at: {format_time(model.created_at)}"
+                f"\n\tupdated at: {format_time(model.updated_at)}" )
+    components = result.get('components', [])
+    
+    # get description
+    description = model.latest_update.get('body', '')
+    message += f"\n\tdescription: {description}"
+
+    for component in components:
+        message += f"\n\t\tcomponent: {component['name']} -> {component['status']}"
+    return message
+
+def get_incident(incident_id):
+    output = {"error": "", "message": "", "data": ""}
     try:
-        r = requests.get(target_url, headers=HEADERS)
-        result = r.json()
-        r.raise_for_status()
-        message = f"Total unresolved incidents: {len(result)}"
-        if len(result) > 0:
-            for incident in result:
-                table_data.append([incident['id'], incident['name'], incident['status'], convert_utc_to_gmt8(incident['updated_at'])])
-            message += create_table(table_data)
-        output['message'] = message
+        result = fetch_incident(incident_id)
+        output['message'] = format_incident(result)
         output['data'] = result
     except requests.exceptions.RequestException as err:
-        output['error'] = f"Operation failed: {err}"
+        stale = stale_read('unresolved', pick_incident(incident_id), incident_pages.get(incident_id) or PAGE_ID) if api_unavailable(err) else None
+        if stale:
+            output['data'] = stale[0]
+            output['message'] = stale[1] + format_incident(stale[0])
+        else:
+            output['error'] = f"Operation failed: {err}"
     return output
 
-def get_incident(incident_id):
+def format_incident_timeline(result, updates, seen_at):
+    message = f"Incident: {result['name']} ({result['status']})"
+    if seen_at is not None:
+        message += f"\n{len(updates) or 'No'} new updates since {format_time(seen_at)}"
+    for created_at, update in updates:
+        message += f"\n\t{format_time(created_at)} [{update['status']}] {update.get('body') or ''}"
+    return message
+
+def incident_timeline(channel_id, result, show_all=False):
+    """
+     timeline message of the updates `channel_id` has not seen yet (all of them with `show_all`),
+     then moves the channel's cursor to the newest update. shared by the sync and async apis
+    """
+    model = incident_model(result)
+    key = (channel_id, model.id)
+    seen_at = None if show_all else timeline_cursors.get(key)
+    updates = model.updates_after(seen_at)
+    if model.updates:
+        timeline_cursors.set(key, model.updates[0][0])
+    return format_incident_timeline(result, updates, seen_at)
+
+def get_incident_timeline(channel_id, incident_id=None, show_all=False):
     output = {"error": "", "message": "", "data": ""}
-    target_url = f"{URL}{PAGE_ID}/incidents/{incident_id}"
+    incident_id = incident_id or get_unresolved_incident_id_by_channel_id(channel_id)
     try:
-        r = requests.get(target_url, headers=HEADERS)
-        result = r.json()
-        r.raise_for_status()
-        message = ( f"Incident: {result['name']}"
-                    f"\n\tstatus: {result['status']}"
-                    f"\n\timpact: {result['impact']}"
-                    f"\n\tcreated at: {convert_utc_to_gmt8(result['created_at'])}"
-                    f"\n\tupdated at: {convert_utc_to_gmt8(result['updated_at'])}" )
-        components = result.get('components', [])
-        
-        # get description
-        latest_update = {}
-        for incident_update in result['incident_updates']:
-            created_at = datetime.fromisoformat(incident_update['created_at'].replace("Z", "+00:00"))
-            if not latest_update or created_at > datetime.fromisoformat(latest_update['created_at'].replace("Z", "+00:00")):
-                latest_update = incident_update
-        description = latest_update.get('body', '')
-        message += f"\n\tdescription: {description}"
-
-        for component in components:
-            message += f"\n\t\tcomponent: {component['name']} -> {component['status']}"
-        output['message'] = message
+        result = fetch_incident(incident_id)
+        output['message'] = incident_timeline(channel_id, result, show_all)
         output['data'] = result
     except requests.exceptions.RequestException as err:
-        output['error'] = f"Operation failed: {err}"
+        stale = stale_read('unresolved', pick_incident(incident_id), incident_pages.get(incident_id) or PAGE_ID) if api_unavailable(err) else None
+        if stale:
+            output['data'] = stale[0]
+            output['message'] = stale[1] + incident_timeline(channel_id, stale[0], show_all)
+        else:
+            output['error'] = f"Operation failed: {err}"
     return output
 
-def update_incident(incident_id, status, body):
-    # resolve components too if incident is resolved
+def parse_incident_filters(args):
+    """
+     filters of `get incidents`, raises ValueError on an invalid one
+        - since:<YYYY-MM-DD> or since:<n>d, until:<YYYY-MM-DD> (inclusive, utc)
+        - status:<status>[,<status>], impact:<impact>[,<impact>]
+        - limit:<n>
+    """
+    filters = {"since": None, "until": None, "status": None, "impact": None, "limit": HISTORY_LIMIT}
+    for arg in args.split():
+        name, _, value = arg.partition(':')
+        try:
+            if name == 'since' and value.endswith('d'):
+                filters['since'] = datetime.now(timezone.utc) - timedelta(days=int(value[:-1]))
+            elif name == 'since':
+                filters['since'] = datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+            elif name == 'until':
+                filters['until'] = datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc) + timedelta(days=1)
+            elif name in ('status', 'impact') and value:
+                filters[name] = set(value.lower().split(','))
+            elif name == 'limit':
+                filters['limit'] = int(value)
+            else:
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"Invalid filter `{arg}`. Use since:<YYYY-MM-DD|<n>d>, until:<YYYY-MM-DD>, status:<status>, impact:<impact>, limit:<n>")
+    return filters
+
+def filter_incidents(incidents, filters, remaining):
+    """
+     matching incidents of one page (newest first) and whether the filter window is exhausted
+    """
+    matches = []
+    for incident in incidents:
+        if len(matches) >= remaining:
+            return matches, True
+        created_at = parse_time(incident['created_at'])
+        if filters['since'] and created_at < filters['since']:
+            return matches, True
+        if filters['until'] and created_at >= filters['until']:
+            continue
+        if filters['status'] and incident['status'] not in filters['status']:
+            continue
+        if filters['impact'] and incident['impact'] not in filters['impact']:
+            continue
+        matches.append(incident)
+    return matches, False
+
+def iter_incidents(filters, per_page=HISTORY_PAGE_SIZE):
+    """
+     matching incidents, newest first. a page is only fetched when the previous one is consumed
+     and paging stops as soon as the filter window is exhausted.
+    """
+    page = 1
+    remaining = filters['limit']
+    while remaining > 0:
+        r = statuspage_client.get(f"{URL}{PAGE_ID}/incidents", params={"page": page, "per_page": per_page})
+        result = r.json()
+        r.raise_for_status()
+        matches, done = filter_incidents(result, filters, remaining)
+        remaining -= len(matches)
+        yield from matches
+        if done or len(result) < per_page:
+            return
+        page += 1
+
+def incident_history_row(incident):
+    return [incident['id'], incident['name'], incident['status'], incident['impact'], convert_utc_to_display(incident['created_at'])]
+
+def format_incident_history_end(rows, filters):
+    if rows == 0:
+        return "No incidents found"
+    if rows >= filters['limit']:
+        return f"Total incidents: {rows} (limit reached, narrow the filters or raise limit:<n>)"
+    return f"Total incidents: {rows}"
+
+def stream_incidents(args):
+    """
+     `get incidents`: yields outputs of one slack message each, the first one as soon as
+     the first page is in, so time to first reply and memory do not grow with history size
+    """
     output = {"error": "", "message": "", "data": ""}
-    target_url = f"{URL}{PAGE_ID}/incidents/{incident_id}"
+    try:
+        filters = parse_incident_filters(args)
+    except ValueError as err:
+        output['error'] = str(err)
+        yield output
+        return
+    table = TableChunks(HISTORY_COLUMNS, HISTORY_WIDTHS)
+    try:
+        for incident in iter_incidents(filters):
+            chunk = table.add(incident_history_row(incident))
+            if chunk:
+                yield {"error": "", "message": chunk, "data": ""}
+    except requests.exceptions.RequestException as err:
+        output['error'] = f"Operation failed: {err}"
+        yield output
+        return
+    output['message'] = (table.flush() or '') + '\n' + format_incident_history_end(table.rows, filters)
+    yield output
+
+def components_to_resolve(incident):
     components_to_update = {}
+    components = incident.get('components', []) if incident else []
+    component_ids = [component['id'] for component in components]
+    for component_id in component_ids:
+        components_to_update[component_id] = "operational"
+    return components_to_update
 
-    # resolve components if resolving incident
-    if status == "resolved":
-        incident = get_incident(incident_id)['data']
-        components = incident.get('components', [])
-        component_ids = [component['id'] for component in components]
-        for component_id in component_ids:
-            components_to_update[component_id] = "operational"
-    data = {
+def update_incident_payload(status, body, components_to_update):
+    return {
         "incident": {
             "status": status,
             "body": body,
             "components": components_to_update
         }  
     }
+
+def format_updated_incident(result):
+    return ( f"Incident: {result['name']}"
+             f"\n\tstatus: {result['status']}")
+
+def update_incident(incident_id, status, body):
+    # resolve components too if incident is resolved
+    output = {"error": "", "message": "", "data": ""}
+    components_to_update = {}
+
+    incident = None
+    page_id = incident_pages.get(incident_id) if MULTI_PAGE else PAGE_ID
+    # the incident is only read to resolve its components or to find the page it is on
+    if status == "resolved" or page_id is None:
+        incident = get_incident(incident_id)['data']
+        page_id = page_of(incident) if incident else PAGE_ID
+    target_url = f"{URL}{page_id}/incidents/{incident_id}"
+    # resolve components if resolving incident
+    if status == "resolved":
+        components_to_update = components_to_resolve(incident)
+    data = update_incident_payload(status, body, components_to_update)
     try:
-        r = requests.patch(target_url, headers=HEADERS, json=data)
+        r = statuspage_client.patch(target_url, json=data)
         result = r.json()
         r.raise_for_status()
-        message = ( f"Incident: {result['name']}"
-                    f"\n\tstatus: {result['status']}")
-        output['message'] = message
+        incident_updated(incident_id, result, components_to_update)
+        output['message'] = format_updated_incident(result)
     except requests.exceptions.RequestException as err:
         output['error'] = f"Operation failed: {err}"
     return output
 
+def find_incident_id_by_channel_id(channel_id):
+    # the index is built by the first unresolved fetch, later lookups are local
+    if not channel_index.built:
+        try:
+            fetch_unresolved_incidents()
+        except requests.exceptions.RequestException:
+            return None
+    return channel_index.get(channel_id)
+
 def get_unresolved_incident_id_by_channel_id(channel_id):
-    unresolved_incidents = get_unresolved_incidents()['data']
-    
-    for incident in unresolved_incidents:
-        if incident['metadata'].get('slack', {}).get('channel_id') == channel_id:
-            return incident['id']
-    
-    return "channel not linked to any incident"
+    return find_incident_id_by_channel_id(channel_id) or "channel not linked to any incident"
 
 def get_incident_by_channel_id(channel_id):
     incident_id = get_unresolved_incident_id_by_channel_id(channel_id)
@@ -135,59 +730,181 @@ def update_incident_by_channel_id(channel_id, status, body):
     incident_id = get_unresolved_incident_id_by_channel_id(channel_id)
     return update_incident(incident_id, status, body)
 
+@render_cache()
+def format_components(result):
+    message = "Components' status"
+    for component in result:
+        message += f"\n\t {page_label(page_of(component))}{component['name']} -> {component['status']}"
+    return message
+
 def get_components():
     output = {"error": "", "message": "Components' status", "data": ""}
-    target_url = f"{URL}{PAGE_ID}/components"
-    try:
-        r = requests.get(target_url, headers=HEADERS)
-        result = r.json()
-        r.raise_for_status()
+    lists, notes, output['error'] = gather_pages(fan_out(fetch_page_components), 'components')
+    if not output['error']:
+        result = merge_components(lists)
         output['data'] = result
-        for component in result:
-            output['message'] += f"\n\t {component['name']} -> {component['status']}"
-    except requests.exceptions.RequestException as err:
-        output['error'] = f"Operation failed: {err}"
+        output['message'] = notes + format_components(result)
     return output
 
-def get_component_by_name(component_name):
-    component_name = component_name.lower()
+def find_component(components, component_name):
+    """
+     a component by its exact name (case and whitespace insensitive) or `<group>/<name>`.
+     the error suggests names when several components match, when `component_name` is a prefix
+     of names or when it looks like a typo
+    """
     output = {"error": "", "message": "", "data": ""}
-    components_result = get_components()
-    if components_result['error']:
-        output['error'] = components_result['error']
+    index = component_index.sync(components)
+    component, candidates = index.lookup(component_name)
+    if component:
+        output['data'] = component
+        output['message'] = f"Component: {component['name']} -> {component['status']}"
+    elif candidates and index.exact(component_name):
+        output['error'] = f"Component {component_name} matches several components{did_you_mean(candidates)}"
     else:
-        components = components_result['data']
-        # find component by name
-        for component in components:
-            if component['name'].lower() == component_name:
-                output['data'] = component
-                output['message'] = f"Component: {component['name']} -> {component['status']}"
-                break
+        output['error'] = f"Component {component_name} not found{did_you_mean(candidates or index.suggest(component_name))}"
+    return output
+
+def format_component_matches(components):
+    # (group name, component) pairs for the picker, the group is tagged with the page when there are several
+    return [(page_label(page_of(component)) + component_index.group_name(component), component) for component in components]
+
+def search_components(query):
+    """
+     components matching `query` for the incident modal's component picker
+    """
+    output = {"error": "", "message": "", "data": []}
+    lists, _, output['error'] = gather_pages(fan_out(fetch_page_components), 'components')
+    if not output['error']:
+        output['data'] = format_component_matches(component_index.sync(merge_components(lists)).search(query))
+    return output
+
+def get_component_by_name(component_name):
+    output = {"error": "", "message": "", "data": ""}
+    try:
+        output = find_component(fetch_components(), component_name)
+    except requests.exceptions.RequestException as err:
+        output['error'] = f"Operation failed: {err}"
     return output
 
+def component_payload(status):
+    return {
+        "component": {
+            "status": status
+        }  
+    }
+
+def format_updated_component(result):
+    return f"Component update: {page_label(page_of(result))}{result['name']} -> {result['status']}"
 
 def update_component_by_name(component_name, status):
     output = {"error": "", "message": "", "data": ""}
     component_result = get_component_by_name(component_name)
     if component_result['data']:
-        component_id = component_result['data']['id']
-        target_url = f"{URL}{PAGE_ID}/components/{component_id}"
-        data = {
-            "component": {
-                "status": status
-            }  
-        }
-        try:
-            r = requests.put(target_url, headers=HEADERS, json=data)
-            result = r.json()
-            r.raise_for_status()
-            output['message'] = f"Component update: {result['name']} -> {result['status']}"
-        except requests.exceptions.RequestException as err:
-            output['error'] = f"Operation failed: {err}"
+        output = update_component(component_result['data']['id'], status, page_of(component_result['data']))
     else:
         output['error'] = component_result['error'] if component_result['error'] else f"Component {component_name} not found" 
     return output
 
+def update_component(component_id, status, page_id=PAGE_ID):
+    output = {"error": "", "message": "", "data": ""}
+    target_url = f"{URL}{page_id}/components/{component_id}"
+    data = component_payload(status)
+    try:
+        r = statuspage_client.put(target_url, json=data)
+        result = r.json()
+        r.raise_for_status()
+        patch_cached_component(result)
+        output['message'] = format_updated_component(result)
+        output['data'] = result
+    except requests.exceptions.RequestException as err:
+        output['error'] = f"Operation failed: {err}"
+    return output
+
+def parse_component_targets(text):
+    # "api, web*, group:trading" -> ["api", "web*", "group:trading"]
+    return [target.strip() for target in text.split(',') if target.strip()]
+
+def resolve_components(components, targets):
+    """
+     resolve bulk update targets against one component snapshot.
+     a target is a component name, a glob (`web*`) or a group (`group:<name>`);
+     naming a group or matching one with a glob selects the components in it.
+     only globs and groups select several components: a name matching several is not found, like in find_component.
+     returns (components to update, ordered by page, position and name, targets that matched nothing)
+    """
+    index = component_index.sync(components)
+    selected = {}
+    not_found = []
+
+    def select(component):
+        if component.get('group'):
+            for child_id in component.get('components') or []:
+                child = index.component(child_id)
+                if child is not None:
+                    selected[child_id] = child
+        else:
+            selected[component['id']] = component
+
+    for target in targets:
+        pattern = normalize(target)
+        if pattern.startswith('group:'):
+            matches = index.group(pattern[len('group:'):])
+        elif pattern.endswith('*') and not any(char in pattern[:-1] for char in '*?['):
+            matches = index.prefixed(pattern[:-1])
+        elif any(char in pattern for char in '*?['):
+            matches = [c for c in components if fnmatch.fnmatchcase(normalize(c['name']), pattern)]
+        else:
+            component, candidates = index.lookup(pattern)
+            if component is None:
+                several = " matches several components" if candidates and index.exact(pattern) else ""
+                not_found.append(target + several + did_you_mean(candidates or index.suggest(target)))
+                continue
+            matches = [component]
+        if not matches:
+            not_found.append(target + did_you_mean(index.suggest(target)))
+        for component in matches:
+            select(component)
+    return sorted(selected.values(), key=component_order), not_found
+
+def component_order(component):
+    return PAGE_ORDER.get(page_of(component), len(PAGE_ORDER)), component.get('position', 0), component['name']
+
+def format_bulk_update(results, not_found):
+    failed = [(component, output) for component, output in results if output['error']]
+    message = f"Bulk component update: {len(results) - len(failed)} updated, {len(failed)} failed, {len(not_found)} not found"
+    for component, output in results:
+        if output['error']:
+            message += f"\n\t{page_label(page_of(component))}{component['name']} failed: {output['error']}"
+        else:
+            message += f"\n\t{output['message']}"
+    for target in not_found:
+        message += f"\n\tnot found: {target}"
+    return message
+
+def update_components_by_names(targets, status):
+    output = {"error": "", "message": "", "data": ""}
+    try:
+        components, not_found = resolve_components(fetch_components(), parse_component_targets(targets))
+    except requests.exceptions.RequestException as err:
+        output['error'] = f"Operation failed: {err}"
+        return output
+    if not components:
+        output['error'] = f"No components matched: {', '.join(not_found)}"
+        return output
+    outputs = bulk_executor.map(lambda component: update_component(component['id'], status, page_of(component)), components)
+    results = list(zip(components, outputs))
+    output['message'] = format_bulk_update(results, not_found)
+    output['data'] = [result['data'] for _, result in results if result['data']]
+    return output
+
+@render_cache()
+def format_templates(result):
+    message = "Available templates:"
+    for template in result:
+        message += f"\n- {template['name']}"
+        message += f"\n\ttitle: {template['title']}"
+    return message
+
 # function to list available templates
 # outputs a list of templates (template name)
 def get_templates():
@@ -195,37 +912,52 @@ def get_templates():
     target_url = f"{URL}{PAGE_ID}/incident_templates"
     output['message'] = "Available templates:"
     try:
-        r = requests.get(target_url, headers=HEADERS)
-        result = r.json()
-        r.raise_for_status()
+        result = cached_get(templates_cache, PAGE_ID, target_url)
         output['data'] = result
-        for template in result:
-            output['message'] += f"\n- {template['name']}"
-            output['message'] += f"\n\ttitle: {template['title']}"
+        output['message'] = format_templates(result)
     except requests.exceptions.RequestException as err:
-        output['error'] = f"Operation failed: {err}"
+        stale = stale_read('templates') if api_unavailable(err) else None
+        if stale:
+            output['data'] = stale[0]
+            output['message'] = stale[1] + format_templates(stale[0])
+        else:
+            output['error'] = f"Operation failed: {err}"
     return output
 
 # function to get details of a template
 # there's no api call to get a detail of a template
 # basically, calling the same list of templates to get details of a template
+def find_template(templates, template_name):
+    output = {"error": "", "message": "", "data": ""}
+    for template in templates:
+        if template['name'].lower() == template_name.lower():
+            output['data'] = template
+            output['message'] = f"Template: {template['name']}"
+            output['message'] += f"\n\ttitle: {template['title']}"
+            output['message'] += f"\n\tstatus: {template['update_status']}"
+            output['message'] += f"\n\tdescription: {template['body']}"
+            for component in template['components']:
+                output['message'] += f"\n\t\tcomponent: {component['name']} -> {component['status']}"
+            break
+    if not output['data']:
+        output['error'] = f"Template {template_name} not found"
+    return output
+
 def get_template(template_name):
     output = {"error": "", "message": "", "data": ""}
     templates = get_templates()
 
     if not templates['error']:
-        for template in templates['data']:
-            if template['name'].lower() == template_name.lower():
-                output['data'] = template
-                output['message'] = f"Template: {template['name']}"
-                output['message'] += f"\n\ttitle: {template['title']}"
-                output['message'] += f"\n\tstatus: {template['update_status']}"
-                output['message'] += f"\n\tdescription: {template['body']}"
-                for component in template['components']:
-                    output['message'] += f"\n\t\tcomponent: {component['name']} -> {component['status']}"
-                break
-        if not output['data']:
-            output['error'] = f"Template {template_name} not found"
+        output = find_template(templates['data'], template_name)
     else:
         output['error'] = templates['error']
     return output
+
+def format_client_stats(stats):
+    output = {"error": "", "message": "Statuspage api calls", "data": stats}
+    for name, value in stats.items():
+        output['message'] += f"\n\t{name}: {value}"
+    return output
+
+def get_client_stats():
+    return format_client_stats(statuspage_client.stats())
@@ -0,0 +1,181 @@
+import os
+import re
+import json
+import time
+import requests
+from functools import lru_cache
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+import metrics
+from throttle import TokenBucket, SingleFlight
+from conditional import ValidatorStore
+
+load_dotenv()
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+READ_METHODS = ('GET', 'HEAD')
+
+# statuspage rate limits per api key, so one bucket is shared by the sync and async clients
+rate_limiter = TokenBucket(
+    rate=float(os.getenv('STATUSPAGE_RATE_LIMIT') or 1),
+    burst=int(os.getenv('STATUSPAGE_RATE_BURST') or 5),
+    reserve=int(os.getenv('STATUSPAGE_RATE_WRITE_RESERVE') or 1),
+)
+
+# validators and bodies of the GETs served by get_json, also shared by the sync and async clients
+validator_store = ValidatorStore(maxsize=int(os.getenv('STATUSPAGE_VALIDATOR_CACHE_SIZE') or 512))
+
+@metrics.collector
+def rate_limiter_metrics():
+    yield 'statuspage_rate_limiter_tokens', 'gauge', "Tokens left in the client rate limiter", [({}, rate_limiter.available())]
+    yield 'statuspage_rate_limiter_acquired_total', 'counter', "Statuspage api calls let through by the client rate limiter", [({}, rate_limiter.acquired)]
+    yield 'statuspage_rate_limiter_delayed_total', 'counter', "Statuspage api calls delayed by the client rate limiter", [({}, rate_limiter.delayed)]
+    yield 'statuspage_rate_limiter_delayed_seconds_total', 'counter', "Time spent waiting for the client rate limiter", [({}, rate_limiter.delayed_seconds)]
+    yield 'statuspage_conditional_gets_total', 'counter', "GET bodies reused after a 304 (not_modified) or an identical payload (unchanged), or parsed (changed)", [
+        ({'outcome': 'not_modified'}, validator_store.not_modified),
+        ({'outcome': 'unchanged'}, validator_store.unchanged),
+        ({'outcome': 'changed'}, validator_store.changed),
+    ]
+
+def parse_json(content):
+    # a 200 whose body is not json (a proxy or maintenance page) fails as a RequestException like r.json() does
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError as err:
+        raise requests.exceptions.JSONDecodeError(err.msg, err.doc, err.pos)
+    except ValueError as err:
+        raise requests.exceptions.InvalidJSONError(err)
+
+@lru_cache(maxsize=1024)
+def endpoint_of(url):
+    # metrics label for a call: the path after the page id with ids replaced, e.g. /incidents/{id}
+    path = re.sub(r'^.*?/pages/[^/]+', '', urlparse(url).path)
+    return re.sub(r'/(incidents|components|incident_templates)/(?!unresolved$)[^/]+', r'/\1/{id}', path) or '/'
+
+class StatuspageRetry(Retry):
+    """
+     retry policy for the statuspage api
+        - 5xx are only retried for idempotent methods (GET, PUT)
+        - 429 is retried for every method since the request was never processed
+    """
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429:
+            return bool(self.total)
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def increment(self, method=None, url=None, response=None, *args, **kwargs):
+        metrics.retries.inc(method=method, status=response.status if response is not None else 'error')
+        return super().increment(method, url, response, *args, **kwargs)
+
+class StatuspageClient:
+    """
+     shared http client for the statuspage api.
+     one pooled keep-alive session is reused by every call, so a slash-command flow
+     pays the tcp/tls handshake once instead of once per call.
+     every call takes a token from `limiter`; identical concurrent GETs share one upstream response.
+     get_json revalidates the body of its last GET of a url through `validators`.
+    """
+    def __init__(self, api_key, pool_size=10, connect_timeout=3.05, read_timeout=10, max_retries=3, backoff_factor=0.5, limiter=None, validators=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.limiter = limiter
+        self.validators = validators
+        self.singleflight = SingleFlight()
+        self.session = requests.Session()
+        self.session.headers.update({'Authorization': f"OAuth {api_key}"})
+        retry = StatuspageRetry(
+            total=max_retries,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'PUT']),
+            backoff_factor=backoff_factor,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if method in READ_METHODS and 'json' not in kwargs:
+            key = (method, url, tuple(sorted((kwargs.get('params') or {}).items())))
+            return self.singleflight.do(key, lambda: self._send(method, url, **kwargs))
+        return self._send(method, url, **kwargs)
+
+    def _send(self, method, url, **kwargs):
+        if self.limiter is not None:
+            self.limiter.acquire(write=method not in READ_METHODS)
+        status = None
+        metrics.requests_in_flight.inc()
+        started_at = time.perf_counter()
+        try:
+            r = self.session.request(method, url, **kwargs)
+            status = r.status_code
+            return r
+        finally:
+            metrics.requests_in_flight.dec()
+            metrics.record_request(method, endpoint_of(url), status, time.perf_counter() - started_at)
+
+    def get_json(self, url):
+        """
+         parsed body of a GET of `url`, raises requests.HTTPError on an error status
+        """
+        if self.validators is None:
+            r = self.get(url)
+            r.raise_for_status()
+            return r.json()
+        return self.singleflight.do(('json', url), lambda: self._get_json(url))
+
+    def _get_json(self, url):
+        r = self._send('GET', url, headers=self.validators.headers(url), timeout=self.timeout)
+        if r.status_code == 304:
+            result = self.validators.revalidated(url)
+            if result is not None:
+                return result
+            r = self._send('GET', url, timeout=self.timeout)
+        r.raise_for_status()
+        return self.validators.store(url, r.headers, r.content, parse_json)
+
+    def stats(self):
+        stats = {"coalesced": self.singleflight.coalesced}
+        if self.validators is not None:
+            stats.update({
+                "not modified": self.validators.not_modified,
+                "unchanged bodies": self.validators.unchanged,
+            })
+        if self.limiter is not None:
+            stats.update({
+                "rate limited": self.limiter.delayed,
+                "rate limited seconds": round(self.limiter.delayed_seconds, 2),
+                "sent": self.limiter.acquired,
+            })
+        return stats
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+def client_from_env():
+    return StatuspageClient(
+        os.getenv('STATUSPAGE_API_KEY'),
+        pool_size=int(os.getenv('STATUSPAGE_POOL_SIZE') or 10),
+        connect_timeout=float(os.getenv('STATUSPAGE_CONNECT_TIMEOUT') or 3.05),
+        read_timeout=float(os.getenv('STATUSPAGE_READ_TIMEOUT') or 10),
+        max_retries=int(os.getenv('STATUSPAGE_MAX_RETRIES') or 3),
+        backoff_factor=float(os.getenv('STATUSPAGE_BACKOFF_FACTOR') or 0.5),
+        limiter=rate_limiter,
+        validators=validator_store,
+    )
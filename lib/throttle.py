@@ -0,0 +1,150 @@
+import time
+import asyncio
+import threading
+
+class TokenBucket:
+    """
+     client-side rate limiter shared by every outgoing statuspage call.
+     writes have priority over reads:
+        - reads leave `reserve` tokens in the bucket for writes
+        - reads wait while a write is waiting for a token
+    """
+    def __init__(self, rate, burst, reserve=1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.reserve = min(reserve, self.burst - 1)
+        self.acquired = 0
+        self.delayed = 0
+        self.delayed_seconds = 0.0
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._waiting_writes = 0
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, write):
+        # returns 0 when a token was taken, otherwise the seconds to wait before trying again
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            needed = 1 if write else 1 + self.reserve
+            if self._tokens >= needed and (write or self._waiting_writes == 0):
+                self._tokens -= 1
+                self.acquired += 1
+                return 0
+            return max(needed - self._tokens, 0.01) / self.rate
+
+    def available(self):
+        # tokens in the bucket right now, without taking one
+        with self._lock:
+            return min(self.burst, self._tokens + (time.monotonic() - self._updated_at) * self.rate)
+
+    def _waiting(self, write, delta):
+        if write:
+            with self._lock:
+                self._waiting_writes += delta
+
+    def acquire(self, write=False):
+        if self.rate <= 0:
+            return
+        wait = self._try_acquire(write)
+        if not wait:
+            return
+        started_at = time.monotonic()
+        self._waiting(write, 1)
+        try:
+            while wait:
+                time.sleep(wait)
+                wait = self._try_acquire(write)
+        finally:
+            self._waiting(write, -1)
+            self._record_delay(started_at)
+
+    async def acquire_async(self, write=False):
+        if self.rate <= 0:
+            return
+        wait = self._try_acquire(write)
+        if not wait:
+            return
+        started_at = time.monotonic()
+        self._waiting(write, 1)
+        try:
+            while wait:
+                await asyncio.sleep(wait)
+                wait = self._try_acquire(write)
+        finally:
+            self._waiting(write, -1)
+            self._record_delay(started_at)
+
+    def _record_delay(self, started_at):
+        with self._lock:
+            self.delayed += 1
+            self.delayed_seconds += time.monotonic() - started_at
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+     in-flight deduplication: concurrent calls with the same key share the first caller's result
+    """
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+class AsyncSingleFlight:
+    """
+     asyncio counterpart of SingleFlight, followers await the leader's future
+    """
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+
+    async def do(self, key, fn):
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as err:
+            future.set_exception(err)
+            # retrieved here so an error nobody else awaited is not logged as unhandled
+            future.exception()
+            raise
+        finally:
+            del self._calls[key]
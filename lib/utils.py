@@ -1,4 +1,35 @@
-from datetime import datetime, timedelta
+import os
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from zoneinfo import ZoneInfo
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# stay under slack's limit for the text of one message
+SLACK_MESSAGE_CHARS = 3000
+
+def parse_timezone(name):
+    """
+     `UTC`, a fixed offset like `+08:00` / `-05:30`, or an IANA name like `Asia/Kuala_Lumpur`
+    """
+    if name.upper() == 'UTC':
+        return timezone.utc
+    if name[:1] in '+-':
+        hours, _, minutes = name[1:].partition(':')
+        offset = timedelta(hours=int(hours), minutes=int(minutes or 0))
+        return timezone(-offset if name[0] == '-' else offset)
+    return ZoneInfo(name)
+
+def configure_logging():
+    # the entrypoints log at LOG_LEVEL (INFO by default), METRICS_TRACE lines are logged at INFO
+    logging.basicConfig(level=(os.getenv('LOG_LEVEL') or 'INFO').upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+# timezone of every time shown in slack
+DISPLAY_TIMEZONE = parse_timezone(os.getenv('DISPLAY_TIMEZONE') or '+08:00')
 
 def create_table(data):
     # Determine the maximum width for each column
@@ -15,8 +46,79 @@ def create_table(data):
     
     return table
 
-def convert_utc_to_gmt8(utc_datetime):
-    utc_time = datetime.strptime(utc_datetime, "%Y-%m-%dT%H:%M:%SZ")
-    gmt_plus_8_time = utc_time + timedelta(hours=8)
-    gmt_plus_8_time_str = gmt_plus_8_time.strftime("%Y-%m-%d %H:%M:%S")
-    return gmt_plus_8_time_str
\ No newline at end of file
+def parse_time(timestamp):
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+
+def format_time(dt):
+    return dt.astimezone(DISPLAY_TIMEZONE).strftime("%Y-%m-%d %H:%M:%S")
+
+@lru_cache(maxsize=4096)
+def convert_utc_to_display(utc_datetime):
+    # the same timestamps are rendered again on every list, parse each one once
+    return format_time(parse_time(utc_datetime))
+
+def render_cache(maxsize=8):
+    """
+     memoize a render of one list by the identity of the list: read results are never changed
+     in place, and the same object is returned for a body that did not change (see ValidatorStore),
+     so an unchanged list is rendered once. the lists are kept alive, an id cannot be reused meanwhile
+    """
+    def decorate(render):
+        renders = OrderedDict()
+        lock = threading.Lock()
+
+        @wraps(render)
+        def wrapper(data):
+            with lock:
+                entry = renders.get(id(data))
+                if entry is not None and entry[0] is data:
+                    renders.move_to_end(id(data))
+                    return entry[1]
+            text = render(data)
+            with lock:
+                renders[id(data)] = (data, text)
+                renders.move_to_end(id(data))
+                while len(renders) > maxsize:
+                    renders.popitem(last=False)
+            return text
+        return wrapper
+    return decorate
+
+def fit(value, width):
+    value = str(value)
+    return value if len(value) <= width else value[:width - 1] + '~'
+
+class TableChunks:
+    """
+     incremental version of create_table for long lists: rows are rendered as they arrive
+     into tables of at most `max_chars`, each with the header.
+     columns have fixed `widths` (longer values are cut), so no pass over the rows is needed up front.
+    """
+    def __init__(self, header, widths, max_chars=SLACK_MESSAGE_CHARS):
+        self.widths = widths
+        self.max_chars = max_chars
+        self.header = '|'.join(item.center(width) for item, width in zip(header, widths)) + '\n' + '+'.join('-' * width for width in widths)
+        self.rows = 0
+        self._lines = []
+        self._size = len(self.header)
+
+    def add(self, row):
+        """
+         returns a finished table when this row does not fit in the current one, otherwise None
+        """
+        line = '|'.join(fit(item, width).ljust(width) for item, width in zip(row, self.widths))
+        chunk = None
+        if self._lines and self._size + len(line) + 1 > self.max_chars:
+            chunk = self.flush()
+        self._lines.append(line)
+        self._size += len(line) + 1
+        self.rows += 1
+        return chunk
+
+    def flush(self):
+        if not self._lines:
+            return None
+        chunk = '\n' + self.header + '\n' + '\n'.join(self._lines)
+        self._lines = []
+        self._size = len(self.header)
+        return chunk
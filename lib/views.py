@@ -0,0 +1,182 @@
+import os
+import json
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'template')
+
+# global arrays
+INCIDENT_STATUSES = ['investigating', 'identified', 'monitoring', 'resolved', 'scheduled', 'in_progress', 'verifying', 'completed']
+IMPACTS = ['none', 'maintenance', 'minor', 'major', 'critical']
+COMPONENT_STATUSES = ['operational', 'under_maintenance', 'degraded_performance', 'partial_outage', 'major_outage']
+# slack limits of an external select response and of option texts
+MAX_OPTIONS = 100
+MAX_OPTION_TEXT = 75
+
+NOT_ALLOWED_INCIDENT_ATTACHED = '\nThis channel is attached to an unresolved incident.\nUse another channel to declare the incident or resolve the incident in this channel.'
+
+def load_template(name, required_block_ids=()):
+    with open(os.path.join(TEMPLATE_DIR, name)) as file:
+        template = json.load(file)
+    block_ids = {block.get('block_id') for block in template.get('blocks', [])}
+    missing = set(required_block_ids) - block_ids
+    if missing:
+        raise ValueError(f"template {name} is missing blocks: {', '.join(sorted(missing))}")
+    return template
+
+def option(value):
+    return {"text": {"type": "plain_text", "text": value}, "value": value}
+
+# templates are loaded and validated once at import
+INCIDENT_FORM = load_template('incident-form.json', ['select_template', 'incident_name_input', 'select_status', 'select_impact', 'description_input'])
+NOT_ALLOWED = load_template('not-allowed.json', ['text_message'])
+LOADING = load_template('loading.json', ['text_message'])
+COMPONENTS_SELECT = load_template('components-select.json')
+if COMPONENTS_SELECT.get('block_id') != 'select_components' or COMPONENTS_SELECT['element'].get('type') != 'multi_external_select':
+    raise ValueError("template components-select.json must be a select_components block with a multi_external_select")
+
+# static parts of the incident form, shared by every view built below (never mutated)
+STATUS_OPTIONS = [option(status) for status in INCIDENT_STATUSES]
+IMPACT_OPTIONS = [option(impact) for impact in IMPACTS]
+
+def with_element_options(block, options, key='element'):
+    return {**block, key: {**block[key], 'options': options}}
+
+STATIC_FORM_BLOCKS = {
+    'select_status': with_element_options(next(b for b in INCIDENT_FORM['blocks'] if b.get('block_id') == 'select_status'), STATUS_OPTIONS),
+    'select_impact': with_element_options(next(b for b in INCIDENT_FORM['blocks'] if b.get('block_id') == 'select_impact'), IMPACT_OPTIONS),
+}
+
+def components_block(status):
+    # one searchable multi-select per component status, its options come from the app.options handler
+    block_id = f"{COMPONENTS_SELECT['block_id']}_{status}"
+    return {
+        **COMPONENTS_SELECT,
+        "block_id": block_id,
+        "element": {**COMPONENTS_SELECT['element'], "action_id": block_id},
+        "label": {**COMPONENTS_SELECT['label'], "text": f"{COMPONENTS_SELECT['label']['text']}: {status.replace('_', ' ')}"},
+    }
+
+COMPONENTS_BLOCKS = [components_block(status) for status in COMPONENT_STATUSES]
+COMPONENTS_BLOCK_IDS = {block['block_id']: status for block, status in zip(COMPONENTS_BLOCKS, COMPONENT_STATUSES)}
+
+def build_incident_form(channel_id, templates=()):
+    """
+     the create-incident modal, its size does not depend on the number of components
+    """
+    blocks = []
+    for block in INCIDENT_FORM['blocks']:
+        block_id = block.get('block_id')
+        if block_id in STATIC_FORM_BLOCKS:
+            blocks.append(STATIC_FORM_BLOCKS[block_id])
+        elif block_id == 'select_template':
+            blocks.append(with_element_options(block, [option(template['name']) for template in templates], key='accessory'))
+        else:
+            blocks.append(block)
+    # apply_template replaces their element, so each view gets its own block dicts
+    blocks.extend(dict(block) for block in COMPONENTS_BLOCKS)
+    return {**INCIDENT_FORM, 'private_metadata': channel_id, 'blocks': blocks}
+
+def component_option(name, component_id):
+    text = name if len(name) <= MAX_OPTION_TEXT else name[:MAX_OPTION_TEXT - 1] + '~'
+    return {"text": {"type": "plain_text", "text": text}, "value": component_id}
+
+def build_component_options(matches):
+    """
+     external select response for [(group name, component), ...], grouped by statuspage group
+    """
+    groups = {}
+    for group_name, component in matches[:MAX_OPTIONS]:
+        label = group_name or 'No group'
+        name = f"{group_name}/{component['name']}" if group_name else component['name']
+        groups.setdefault(label, []).append(component_option(name, component['id']))
+    return {"option_groups": [
+        {"label": {"type": "plain_text", "text": label[:MAX_OPTION_TEXT]}, "options": options}
+        for label, options in groups.items()
+    ]}
+
+def build_incident_form_update(view):
+    # keeps the blocks the user already has, only the form shell comes from the template
+    return {**INCIDENT_FORM, 'private_metadata': view['private_metadata'], 'blocks': view['blocks']}
+
+def build_not_allowed(extra_text=''):
+    blocks = [
+        {**block, 'text': {**block['text'], 'text': block['text']['text'] + extra_text}} if block.get('block_id') == 'text_message' else block
+        for block in NOT_ALLOWED['blocks']
+    ]
+    return {**NOT_ALLOWED, 'blocks': blocks}
+
+def build_loading():
+    return dict(LOADING)
+
+def parse_incident_form(view):
+    """
+     read the submitted create-incident modal into create_incident arguments.
+     fields left untouched after picking a template fall back to the template's initial values.
+    """
+    state_values = view["state"]["values"]
+    affected_components = {}
+    affected_components_id = []
+
+    incident_name = state_values["incident_name_input"]["incident_name_input"]["value"]
+    incident_status = state_values["select_status"]["select_status"]["selected_option"]
+    incident_description = state_values["description_input"]["description_input"]["value"]
+
+    if incident_status:
+        incident_status = state_values["select_status"]["select_status"]["selected_option"]["text"]["text"]
+    if not (incident_name and incident_status and incident_description):
+        blocks = view['blocks']
+        for block in blocks:
+            if block['block_id'] == 'incident_name_input' and not incident_name:
+                incident_name = block['element']['initial_value']
+            elif block['block_id'] == 'select_status' and not incident_status:
+                incident_status = block['element']['initial_option']['value']
+            elif block['block_id'] == 'description_input' and not incident_description:
+                incident_description = block['element']['initial_value']
+
+    incident_impact = state_values["select_impact"]["select_impact"]["selected_option"]["text"]["text"]
+    channel_id = view["private_metadata"]
+    # get affected components, one multi-select per status
+    initial_options = {block['block_id']: block['element'].get('initial_options') for block in view['blocks'] if block.get('block_id', '').startswith('select_components_')}
+    for block_id in COMPONENTS_BLOCK_IDS:
+        selected_options = state_values.get(block_id, {}).get(block_id, {}).get("selected_options")
+        if selected_options is None:
+            # untouched after picking a template
+            selected_options = initial_options.get(block_id) or []
+        for selected in selected_options:
+            component_id = selected['value']
+            if component_id not in affected_components:
+                affected_components_id.append(component_id)
+            affected_components[component_id] = COMPONENTS_BLOCK_IDS[block_id]
+
+    return {
+        "name": incident_name,
+        "status": incident_status,
+        "impact": incident_impact,
+        "channel_id": channel_id,
+        "components_id": affected_components_id,
+        "components": affected_components,
+        "body": incident_description,
+    }
+
+def apply_template(form_create_incident, template):
+    for block in form_create_incident['blocks']:
+        # update incident name
+        if block['block_id'] == 'incident_name_input':
+            block['element']['initial_value'] = template['name']
+        elif block['block_id'] == 'select_status':
+            # update incident status
+            # set default menu option
+            for menu_option in block['element']['options']:
+                if menu_option['value'] == template['update_status']:
+                    block['element']['initial_option'] = menu_option
+                    break
+        elif block['block_id'] == 'description_input':
+            # update incident description
+            block['element']['initial_value'] = template['body']            
+        elif block['block_id'] in COMPONENTS_BLOCK_IDS:
+            # update affected components
+            status = COMPONENTS_BLOCK_IDS[block['block_id']]
+            options = [component_option(component['name'], component['id']) for component in template['components'] if component['status'] == status]
+            block['element'] = {key: value for key, value in block['element'].items() if key != 'initial_options'}
+            if options:
+                block['element']['initial_options'] = options
+    return form_create_incident
@@ -0,0 +1,37 @@
+import json
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+def start_webhook_server(port, path, ingest, host='0.0.0.0'):
+    """
+     receive statuspage webhook notifications on POST `path` and pass each json payload to `ingest`.
+     statuspage does not sign webhooks, so `path` should contain a secret.
+    """
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != path:
+                self.send_response(404)
+                self.end_headers()
+                return
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length))
+                if not isinstance(payload, dict):
+                    raise ValueError("webhook payload is not a json object")
+                ingest(payload)
+                self.send_response(204)
+            except (ValueError, KeyError, TypeError, AttributeError):
+                logger.exception("invalid statuspage webhook payload")
+                self.send_response(400)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), WebhookHandler)
+    thread = threading.Thread(target=server.serve_forever, name="statuspage-webhooks", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,262 @@
+"""
+ local fake of the statuspage api (v1) for benchmarks and manual testing.
+ serves incidents, components and incident templates for one page, with configurable
+ latency, error rate and 429 rate, and counts every call it receives.
+ GETs carry an ETag and answer 304 to a matching If-None-Match, unless started with --no-etags.
+ with `maintenance` set, every call gets a 200 html page, as from a proxy in front of the api.
+
+ usage: python tools/fake_statuspage.py [--port 8000] [--components 100] [--incidents 100]
+                                        [--latency 0.05] [--jitter 0.02] [--error-rate 0] [--rate-429 0] [--no-etags]
+ then point the bot at it with STATUSPAGE_API_URL=http://localhost:8000/v1/pages/
+"""
+import re
+import json
+import time
+import hashlib
+import random
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+COMPONENT_STATUSES = ['operational', 'degraded_performance', 'partial_outage', 'major_outage', 'under_maintenance']
+UNRESOLVED_STATUSES = ['investigating', 'identified', 'monitoring']
+
+def timestamp(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class FakeStatuspage:
+    """
+     in-memory statuspage page served over http on a background thread.
+     add_page() serves other pages from the same server, `id_tag` keeps their ids, names and channels apart
+    """
+    def __init__(self, page_id='fakepage', components=10, incidents=10, resolved_incidents=0, templates=5,
+                 latency=0.0, jitter=0.0, error_rate=0.0, rate_429=0.0, seed=1, id_tag='', etags=True):
+        self.page_id = page_id
+        self.etags = etags
+        self.maintenance = False
+        self.id_tag = id_tag
+        self.pages = {page_id: self}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.calls = Counter()
+        self.not_modified = 0
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self.components = {}
+        self.incidents = {}
+        self.templates = []
+        self.seed(components, incidents, resolved_incidents, templates)
+
+    def add_page(self, page):
+        self.pages[page.page_id] = page
+        return page
+
+    def seed(self, components, incidents, resolved_incidents=0, templates=5):
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        group_size = 10
+        tag = self.id_tag
+        for i in range(components):
+            component_id = f"cmp{tag}{i:06d}"
+            self.components[component_id] = {
+                "id": component_id, "page_id": self.page_id, "name": f"component {tag}{i}",
+                "status": "operational", "position": i, "group": False,
+                "group_id": f"grp{tag}{i // group_size:04d}", "description": None,
+                "created_at": timestamp(now), "updated_at": timestamp(now),
+            }
+        for g in range((components + group_size - 1) // group_size):
+            group_id = f"grp{tag}{g:04d}"
+            self.components[group_id] = {
+                "id": group_id, "page_id": self.page_id, "name": f"group {tag}{g}", "status": "operational",
+                "position": components + g, "group": True, "group_id": None,
+                "components": [c for c in self.components if self.components[c].get('group_id') == group_id],
+                "created_at": timestamp(now), "updated_at": timestamp(now),
+            }
+        for i in range(incidents + resolved_incidents):
+            created_at = now - timedelta(hours=i * 6)
+            status = UNRESOLVED_STATUSES[i % len(UNRESOLVED_STATUSES)] if i < incidents else 'resolved'
+            incident_id = f"inc{tag}{i:06d}"
+            self.incidents[incident_id] = {
+                "id": incident_id, "page_id": self.page_id, "name": f"incident {tag}{i}", "status": status,
+                "impact": ['none', 'minor', 'major', 'critical'][i % 4],
+                "created_at": timestamp(created_at), "updated_at": timestamp(created_at + timedelta(minutes=30)),
+                "resolved_at": timestamp(created_at + timedelta(hours=1)) if status == 'resolved' else None,
+                "shortlink": "", "metadata": {"slack": {"channel_id": f"CINC{tag.upper()}{i:06d}"}},
+                "components": [self.components[c] for c in list(self.components)[i % max(components, 1):][:2] if not self.components[c]['group']],
+                "incident_updates": [
+                    {"id": f"{incident_id}-u{u}", "status": status, "body": f"update {u} of incident {i}",
+                     "created_at": timestamp(created_at + timedelta(minutes=10 * u)),
+                     "updated_at": timestamp(created_at + timedelta(minutes=10 * u))}
+                    for u in range(3)
+                ],
+            }
+        self.templates = [
+            {"id": f"tpl{tag}{i:04d}", "name": f"template {tag}{i}", "title": f"template title {i}", "update_status": "investigating",
+             "body": f"template body {i}", "components": [c for c in list(self.components.values())[:2]]}
+            for i in range(templates)
+        ]
+
+    # http routing, returns (status, body)
+    def handle(self, method, path, query, body):
+        match = re.match(r'/v1/pages/([^/]+)', path)
+        page = self.pages.get(match.group(1)) if match else None
+        if page is None:
+            return 404, {"error": "page not found"}
+        return page.handle_page(method, path[match.end():], query, body)
+
+    def handle_page(self, method, path, query, body):
+        with self._lock:
+            if method == 'GET' and path == '/incidents/unresolved':
+                return 200, sorted((i for i in self.incidents.values() if i['status'] not in ('resolved', 'completed', 'postmortem')), key=lambda i: i['created_at'], reverse=True)
+            if method == 'GET' and path == '/incidents':
+                incidents = sorted(self.incidents.values(), key=lambda i: i['created_at'], reverse=True)
+                page = int(query.get('page', ['1'])[0])
+                per_page = int(query.get('per_page', ['100'])[0])
+                return 200, incidents[(page - 1) * per_page:page * per_page]
+            if method == 'POST' and path == '/incidents':
+                return 201, self.create_incident(body['incident'])
+            match = re.fullmatch(r'/incidents/([^/]+)', path)
+            if match:
+                incident = self.incidents.get(match.group(1))
+                if incident is None:
+                    return 404, {"error": "incident not found"}
+                if method == 'GET':
+                    return 200, incident
+                if method == 'PATCH':
+                    return 200, self.update_incident(incident, body['incident'])
+            if method == 'GET' and path == '/components':
+                return 200, sorted(self.components.values(), key=lambda c: c['position'])
+            match = re.fullmatch(r'/components/([^/]+)', path)
+            if match and method in ('PUT', 'PATCH'):
+                component = self.components.get(match.group(1))
+                if component is None:
+                    return 404, {"error": "component not found"}
+                component.update(body['component'])
+                component['updated_at'] = timestamp(datetime.now(timezone.utc))
+                return 200, component
+            if method == 'GET' and path == '/incident_templates':
+                return 200, self.templates
+        return 404, {"error": "not found"}
+
+    def create_incident(self, data):
+        now = timestamp(datetime.now(timezone.utc))
+        incident_id = f"new{self.id_tag}{len(self.incidents):06d}"
+        for component_id, status in (data.get('components') or {}).items():
+            if component_id in self.components:
+                self.components[component_id]['status'] = status
+        incident = {
+            "id": incident_id, "page_id": self.page_id, "name": data.get('name'), "status": data.get('status'),
+            "impact": data.get('impact_override') or 'none', "created_at": now, "updated_at": now, "resolved_at": None,
+            "shortlink": "", "metadata": data.get('metadata') or {},
+            "components": [self.components[c] for c in data.get('component_ids') or [] if c in self.components],
+            "incident_updates": [{"id": f"{incident_id}-u0", "status": data.get('status'), "body": data.get('body'), "created_at": now, "updated_at": now}],
+        }
+        self.incidents[incident_id] = incident
+        return incident
+
+    def update_incident(self, incident, data):
+        now = timestamp(datetime.now(timezone.utc))
+        for component_id, status in (data.get('components') or {}).items():
+            if component_id in self.components:
+                self.components[component_id]['status'] = status
+        incident['status'] = data.get('status', incident['status'])
+        incident['updated_at'] = now
+        if incident['status'] == 'resolved':
+            incident['resolved_at'] = now
+        incident['incident_updates'].insert(0, {"id": f"{incident['id']}-u{len(incident['incident_updates'])}", "status": incident['status'], "body": data.get('body'), "created_at": now, "updated_at": now})
+        return incident
+
+    def start(self, host='127.0.0.1', port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def dispatch(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                key = f"{self.command} {re.sub(r'/(inc|new|cmp|grp)[0-9a-z]+', '/{id}', url.path)}"
+                with fake._lock:
+                    fake.calls[key] += 1
+                    roll = fake.random.random()
+                    delay = max(fake.latency + fake.random.uniform(-fake.jitter, fake.jitter), 0)
+                time.sleep(delay)
+                if roll < fake.rate_429:
+                    status, result, headers = 429, {"error": "rate limited"}, {'Retry-After': '1'}
+                elif roll < fake.rate_429 + fake.error_rate:
+                    status, result, headers = 503, {"error": "unavailable"}, {}
+                else:
+                    status, result = fake.handle(self.command, url.path, parse_qs(url.query), body)
+                    headers = {}
+                payload = json.dumps(result).encode()
+                if fake.maintenance:
+                    status, payload = 200, b"<html><body>down for maintenance</body></html>"
+                if fake.etags and self.command == 'GET' and status == 200:
+                    headers['ETag'] = f'"{hashlib.sha1(payload).hexdigest()}"'
+                    if self.headers.get('If-None-Match') == headers['ETag']:
+                        status, payload = 304, b''
+                        with fake._lock:
+                            fake.not_modified += 1
+                self.send_response(status)
+                if status != 304:
+                    self.send_header('Content-Type', 'text/html' if fake.maintenance else 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = do_PUT = dispatch
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-statuspage", daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/pages/"
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--page-id', default='fakepage')
+    parser.add_argument('--components', type=int, default=100)
+    parser.add_argument('--incidents', type=int, default=10)
+    parser.add_argument('--resolved-incidents', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--no-etags', dest='etags', action='store_false', help="send no ETag, as a server without validators")
+    args = parser.parse_args()
+    fake = FakeStatuspage(args.page_id, args.components, args.incidents, args.resolved_incidents,
+                          latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, rate_429=args.rate_429, etags=args.etags)
+    fake.start(host='0.0.0.0', port=args.port)
+    print(f"fake statuspage on http://localhost:{args.port}/v1/pages/ (STATUSPAGE_PAGE_ID={args.page_id})")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        fake.stop()
+
+if __name__ == "__main__":
+    main()
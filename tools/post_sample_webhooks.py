@@ -0,0 +1,78 @@
+"""
+ local stand-in for statuspage webhooks: posts sample incident and component notifications
+ to the bot's webhook receiver (STATUSPAGE_WEBHOOK_PORT / STATUSPAGE_WEBHOOK_SECRET).
+
+ usage: python tools/post_sample_webhooks.py [--url http://localhost:8080/statuspage/webhook/<secret>]
+                                             [--page-id <id>] [--channel-id <slack channel>]
+"""
+import os
+import json
+import argparse
+import urllib.request
+from datetime import datetime, timezone
+
+def now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def incident_payload(page_id, incident_id, status, body, channel_id):
+    created_at = now()
+    return {
+        "meta": {"unsubscribe": "", "documentation": "https://doers.statuspage.io/customer-notifications/webhooks/"},
+        "page": {"id": page_id, "status_indicator": "minor", "status_description": "Minor Service Outage"},
+        "incident": {
+            "id": incident_id,
+            "name": "Sample webhook incident",
+            "status": status,
+            "impact": "minor",
+            "created_at": created_at,
+            "updated_at": created_at,
+            "shortlink": "",
+            "metadata": {"slack": {"channel_id": channel_id}},
+            "components": [],
+            "incident_updates": [
+                {"id": f"{incident_id}-{status}", "status": status, "body": body, "created_at": created_at, "updated_at": created_at}
+            ],
+        },
+    }
+
+def component_payload(page_id, component_id, name, old_status, new_status):
+    created_at = now()
+    return {
+        "meta": {"unsubscribe": "", "documentation": "https://doers.statuspage.io/customer-notifications/webhooks/"},
+        "page": {"id": page_id, "status_indicator": "minor", "status_description": "Minor Service Outage"},
+        "component_update": {
+            "id": f"{component_id}-{new_status}",
+            "component_id": component_id,
+            "created_at": created_at,
+            "old_status": old_status,
+            "new_status": new_status,
+        },
+        "component": {"id": component_id, "name": name, "status": new_status, "created_at": created_at},
+    }
+
+def post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(request) as response:
+        return response.status
+
+def main():
+    secret = os.getenv('STATUSPAGE_WEBHOOK_SECRET') or ''
+    default_url = f"http://localhost:{os.getenv('STATUSPAGE_WEBHOOK_PORT') or 8080}/statuspage/webhook/{secret}".rstrip('/')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=default_url)
+    parser.add_argument('--page-id', default=os.getenv('STATUSPAGE_PAGE_ID') or 'samplepage')
+    parser.add_argument('--channel-id', default='CSAMPLE')
+    args = parser.parse_args()
+
+    samples = [
+        ("incident investigating", incident_payload(args.page_id, 'sampleincident', 'investigating', 'We are investigating.', args.channel_id)),
+        ("component degraded", component_payload(args.page_id, 'samplecomponent', 'Sample component', 'operational', 'degraded_performance')),
+        ("incident identified", incident_payload(args.page_id, 'sampleincident', 'identified', 'The cause was identified.', args.channel_id)),
+        ("component operational", component_payload(args.page_id, 'samplecomponent', 'Sample component', 'degraded_performance', 'operational')),
+        ("incident resolved", incident_payload(args.page_id, 'sampleincident', 'resolved', 'This incident has been resolved.', args.channel_id)),
+    ]
+    for name, payload in samples:
+        print(f"{name}: {post(args.url, payload)}")
+
+if __name__ == "__main__":
+    main()